@@ -70,7 +70,8 @@ def format_flight_results(flights):
 
             result = {
                 "price": f"{flight['price']['total']} {flight['price']['currency']}",
-                "itineraries": []
+                "itineraries": [],
+                "durations": []  # ISO 8601 duration per itinerary, e.g. PT7H30M
             }
 
             if 'itineraries' not in flight:
@@ -101,6 +102,7 @@ def format_flight_results(flights):
                         continue
 
                 result['itineraries'].append(segments)
+                result['durations'].append(itinerary.get('duration'))
             formatted_results.append(result)
         except KeyError as e:
             logger.error(f"KeyError while formatting flight {i+1}: {e}")
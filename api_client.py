@@ -6,20 +6,26 @@ from hugchat.login import Login
 import streamlit as st
 import logging
 from config import API_MODE, CLAUDE_MODEL_ID, VOYAGE_PROMPT, AWS_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, S3_BUCKET, AWS_CLAUDE_MODEL_ID,AWS_SESSION_TOKEN
+from config import TTS_VOICE_ID, TTS_OUTPUT_FORMAT, TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES
+from config import PROFILE_PROMPT_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, LLM_MAX_TOKENS, REVIEWS_CACHE_MAX_ENTRIES, REVIEW_SUMMARY_CACHE_TTL
+from cache_utils import TTLCache, DiskCache
+from user_profile import profile_version
 import anthropic  # New import for native Claude API
-import time
-import requests
-import sounddevice as sd
-import soundfile as sf
+from aws_clients import get_client
+from llm_provider import get_provider, PROVIDERS
+from speech_to_text import get_transcription_engine
+import threading
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
 logger = logging.getLogger(__name__)
 
 @st.cache_resource
 def initialize_api_client():
     if API_MODE == 'bedrock':
         try:
-            session = boto3.Session()
-            bedrock_client = session.client('bedrock-runtime')
-            return bedrock_client
+            return get_client('bedrock-runtime')
         except Exception as e:
             logger.error(f"Bedrock client initialization failed: {str(e)}")
             st.error(f"Bedrock client initialization failed. Please check your AWS credentials.")
@@ -36,7 +42,8 @@ def initialize_api_client():
             return None
     elif API_MODE == 'native_claude':
         try:
-            claude_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+            # Retries are handled by resilience.call_llm
+            claude_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
             return claude_client
         except Exception as e:
             logger.error(f"Native Claude client initialization failed: {str(e)}")
@@ -47,8 +54,39 @@ def initialize_api_client():
         st.error(f"Invalid API_MODE. Please check your configuration.")
         return None
         
-def invoke_model(prompt, api_client, user_profile, context=""):
-    
+ERROR_MESSAGE = "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
+
+# Rendered prompt prefixes keyed by (username, profile version), shared across sessions
+_prompt_prefix_cache = OrderedDict()
+_prompt_prefix_lock = threading.Lock()
+
+def _profile_cache_key(user_profile):
+    """Return (username, profile version) if user_profile is the session's current copy, else None.
+
+    app.py records the version each time it loads the session's profile, so a
+    match with the live version means the copy has not been saved over since.
+    """
+    if user_profile is not st.session_state.get("user_profile"):
+        return None
+    recorded = st.session_state.get("user_profile_version")
+    if recorded is None or profile_version(recorded[0]) != recorded[1]:
+        return None
+    return recorded
+
+def build_prompt_prefix(user_profile):
+    """Return VOYAGE_PROMPT followed by the rendered user profile block.
+
+    The prefix only changes when the profile does, so it is rendered once per
+    profile version and reused for every turn. Profiles that are not the
+    session's current copy are rendered without caching.
+    """
+    key = _profile_cache_key(user_profile)
+    if key is not None:
+        with _prompt_prefix_lock:
+            if key in _prompt_prefix_cache:
+                _prompt_prefix_cache.move_to_end(key)
+                return _prompt_prefix_cache[key]
+
     past_trips = user_profile.get("past_trips", [])
     upcoming_trips = user_profile.get("upcoming_trips", [])
     credit_cards = user_profile.get("credit_cards", [])
@@ -60,7 +98,7 @@ def invoke_model(prompt, api_client, user_profile, context=""):
     preferences_info = format_preferences(preferences)
     personal_profile = format_personal_profile(profile)
 
-    full_prompt = f"""{VOYAGE_PROMPT}
+    prefix = f"""{VOYAGE_PROMPT}
 
 User Profile Information:
 
@@ -74,59 +112,94 @@ User Profile Information:
 
 {personal_profile}
 
-Recent Conversation:
+"""
+    if key is not None:
+        with _prompt_prefix_lock:
+            _prompt_prefix_cache[key] = prefix
+            while len(_prompt_prefix_cache) > PROFILE_PROMPT_CACHE_SIZE:
+                _prompt_prefix_cache.popitem(last=False)
+    return prefix
+
+def build_query_prompt(prompt, context=""):
+    return f"""Recent Conversation:
 {context}
 
 User Query: {prompt}
 
 TravelEase:"""
-    logger.info(f"Raw response: {full_prompt}")
-    if API_MODE == 'bedrock':
-        try:
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 10000,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": full_prompt
-                    }
-                ]
-            })
-            response = api_client.invoke_model(
-                body=body,
-                modelId=AWS_CLAUDE_MODEL_ID,
-                accept='application/json',
-                contentType='application/json'
-            )
-            response_body = json.loads(response.get('body').read())
-            return response_body['content'][0]['text']
-        except Exception as error:
-            logger.error(f"Error invoking Claude model: {error}")
-            return "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
-    elif API_MODE == 'huggingface':
-        try:
-            response = api_client.chat(full_prompt)
-            return f"TravelEase: {response}"
-        except Exception as e:
-            logger.error(f"Error invoking HuggingFace model: {str(e)}")
-            return "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
-    elif API_MODE == 'native_claude':
-        try:
-            response = api_client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=1000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": full_prompt
-                    }
-                ]
-            )
-            return response.content[0].text
-        except Exception as e:
-            logger.error(f"Error invoking native Claude model: {str(e)}")
-            return "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
+
+def build_prompt(prompt, user_profile, context=""):
+    return build_prompt_prefix(user_profile) + build_query_prompt(prompt, context)
+
+def build_claude_content(prompt, user_profile, context="", cache_prefix=False):
+    """Split the prompt into a static prefix block and a per-turn block.
+
+    With cache_prefix the prefix is marked as a prompt cache point, so
+    repeated turns for the same profile only pay for the new tokens.
+    """
+    prefix_block = {"type": "text", "text": build_prompt_prefix(user_profile)}
+    if cache_prefix:
+        prefix_block["cache_control"] = {"type": "ephemeral"}
+    return [prefix_block, {"type": "text", "text": build_query_prompt(prompt, context)}]
+
+def invoke_model(prompt, api_client, user_profile, context=""):
+    logger.info(f"Raw response: {build_prompt(prompt, user_profile, context)}")
+    try:
+        provider = get_provider(api_client)
+        content = build_claude_content(prompt, user_profile, context, cache_prefix=provider.prompt_caching)
+        return provider.reply_prefix + provider.complete(content, LLM_MAX_TOKENS['chat'])
+    except Exception as e:
+        logger.error(f"Error invoking {API_MODE} model: {str(e)}")
+        return ERROR_MESSAGE
+
+def invoke_model_stream(prompt, api_client, user_profile, context=""):
+    """Yield the model response in text chunks as they are generated.
+
+    Meant to be passed to st.write_stream; on failure the usual apology
+    message is yielded instead so callers can treat both paths the same.
+    """
+    logger.info(f"Raw response: {build_prompt(prompt, user_profile, context)}")
+    try:
+        provider = get_provider(api_client)
+        content = build_claude_content(prompt, user_profile, context, cache_prefix=provider.prompt_caching)
+        prefix = provider.reply_prefix
+        for text in provider.stream(content, LLM_MAX_TOKENS['chat']):
+            yield prefix + text
+            prefix = ""
+    except Exception as e:
+        logger.error(f"Error streaming {API_MODE} model: {str(e)}")
+        yield ERROR_MESSAGE
+
+# Responses to fixed prompts, shared by every session in the process
+_response_cache = TTLCache(RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL)
+
+def _model_id():
+    return PROVIDERS[API_MODE].model_id
+
+def invoke_model_stream_cached(prompt, api_client, user_profile):
+    """Stream the response to a fixed prompt, serving repeats from the response cache.
+
+    Keyed by (prompt, username, profile version, model id), so the cached
+    answer is only refreshed when the profile changes or the entry expires.
+    Error responses are never cached, and neither are answers for a profile
+    that is not the session's current copy.
+    """
+    profile_key = _profile_cache_key(user_profile)
+    if profile_key is None:
+        yield from invoke_model_stream(prompt, api_client, user_profile)
+        return
+    key = (prompt, *profile_key, _model_id())
+    cached = _response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    for chunk in invoke_model_stream(prompt, api_client, user_profile):
+        chunks.append(chunk)
+        yield chunk
+    response = "".join(chunks)
+    if response and ERROR_MESSAGE not in response:
+        _response_cache.set(key, response)
 
 def classify_topic(prompt, api_client):
     full_prompt = f"""
@@ -142,52 +215,36 @@ def classify_topic(prompt, api_client):
     """
     
     logger.info(f"Raw response: {full_prompt}")
-    if API_MODE == 'bedrock':
-        try:
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": full_prompt
-                    }
-                ]
-            })
-            response = api_client.invoke_model(
-                body=body,
-                modelId=AWS_CLAUDE_MODEL_ID,
-                accept='application/json',
-                contentType='application/json'
-            )
-            response_body = json.loads(response.get('body').read())
-            return response_body['content'][0]['text']
-        except Exception as error:
-            logger.error(f"Error invoking Claude model: {error}")
-            return "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
-    elif API_MODE == 'huggingface':
-        try:
-            response = api_client.chat(full_prompt)
-            return f"TravelEase: {response}"
-        except Exception as e:
-            logger.error(f"Error invoking HuggingFace model: {str(e)}")
-            return "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
-    elif API_MODE == 'native_claude':
-        try:
-            response = api_client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=1000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": full_prompt
-                    }
-                ]
-            )
-            return response.content[0].text
-        except Exception as e:
-            logger.error(f"Error invoking native Claude model: {str(e)}")
-            return "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
+    try:
+        provider = get_provider(api_client)
+        return provider.reply_prefix + provider.complete(full_prompt, LLM_MAX_TOKENS['classification'])
+    except Exception as e:
+        logger.error(f"Error invoking {API_MODE} model: {str(e)}")
+        return ERROR_MESSAGE
+
+def summarize_conversation(previous_summary, new_turns, api_client, max_tokens=LLM_MAX_TOKENS['conversation_summary']):
+    """Fold conversation turns that no longer fit the context window into a running summary.
+
+    Returns None on failure so callers can fall back to truncation.
+    """
+    full_prompt = f"""
+    You maintain a running summary of a conversation between a user and the TravelEase travel assistant.
+    Update the summary with the new turns below. Keep destinations, dates, budgets, preferences and any
+    decisions the user made. Reply with the updated summary only, in at most {max_tokens // 2} words.
+
+    Current summary:
+    {previous_summary or "(none)"}
+
+    New turns:
+    {new_turns}
+
+    Updated summary:
+    """
+    try:
+        return get_provider(api_client).complete(full_prompt, max_tokens).strip()
+    except Exception as e:
+        logger.error(f"Error summarizing conversation: {str(e)}")
+    return None
 
 def format_trip_details_old(trip):
     trip_details = f"Destination: {trip['destination']}, Date: {trip['date']}\n"
@@ -260,79 +317,66 @@ def format_personal_profile(profile):
     return profile_info
 
 
-def transcribe_audio(audio_data):
-    print("---AWS_ACCESS_KEY_ID----",AWS_ACCESS_KEY_ID)
-    boto3.set_stream_logger('', logging.DEBUG)
+def transcribe_audio_stream(audio_data):
+    """Yield TranscriptEvents (partial and final) for the recorded audio as the engine produces them."""
+    return get_transcription_engine().transcribe_stream(audio_data)
 
-    session = boto3.Session()
-
-    transcribe_client = session.client('transcribe', region_name=AWS_REGION)
-    
-    s3_client = session.client('s3', region_name=AWS_REGION)
-    
-    # Save audio data to a temporary file
-    with open('temp_audio.wav', 'wb') as f:
-        sf.write(f, audio_data, 16000, format='WAV', subtype='PCM_16')
-    
-    # Upload to S3
-    job_name = f"TravelEase_Transcription_{int(time.time())}"
-    s3_client.upload_file('temp_audio.wav', S3_BUCKET, f"{job_name}.wav")
-    
-    # Start transcription job
-    transcribe_client.start_transcription_job(
-        TranscriptionJobName=job_name,
-        Media={'MediaFileUri': f"s3://{S3_BUCKET}/{job_name}.wav"},
-        MediaFormat='wav',
-        LanguageCode='en-US'
-    )
-    
-    # Wait for transcription job to complete
-    while True:
-        status = transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
-        if status['TranscriptionJob']['TranscriptionJobStatus'] in ['COMPLETED', 'FAILED']:
-            break
-        time.sleep(5)
-    
-    if status['TranscriptionJob']['TranscriptionJobStatus'] == 'COMPLETED':
-        response = requests.get(status['TranscriptionJob']['Transcript']['TranscriptFileUri'])
-        text = json.loads(response.text)['results']['transcripts'][0]['transcript']
-        
-        # Clean up
-        #s3_client.delete_object(Bucket=S3_BUCKET, Key=f"{job_name}.wav")
-        #os.remove('temp_audio.wav')
-        
-        return text
-    else:
-        logger.error("Transcription failed")
+def transcribe_audio(audio_data):
+    try:
+        return get_transcription_engine().transcribe(audio_data)
+    except Exception as e:
+        logger.error(f"Transcription failed: {str(e)}")
         return None
 
-def synthesize_speech(text):
-    session = boto3.Session()
-    polly_client = session.client('polly')
+# Repeated phrases (apologies, quick-action answers, common sentences) are played from here without calling Polly
+_tts_cache = DiskCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+_tts_bytes_saved = 0
+_tts_stats_lock = threading.Lock()
+
+def normalize_speech_text(text):
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+def synthesize_speech(text, voice_id=TTS_VOICE_ID, output_format=TTS_OUTPUT_FORMAT):
+    global _tts_bytes_saved
+    text = normalize_speech_text(text)
+    cache_key = (hashlib.sha256(text.encode('utf-8')).hexdigest(), voice_id, output_format)
+    audio_bytes = _tts_cache.get(cache_key)
+    if audio_bytes is not None:
+        with _tts_stats_lock:
+            _tts_bytes_saved += len(audio_bytes)
+        return audio_bytes
+
+    polly_client = get_client('polly')
 
     response = polly_client.synthesize_speech(
         Text=text,
-        OutputFormat='mp3',
-        VoiceId='Joanna'
+        OutputFormat=output_format,
+        VoiceId=voice_id
     )
-    
+
     if "AudioStream" in response:
-        with open('speech.mp3', 'wb') as file:
-            file.write(response['AudioStream'].read())
-        with open('speech.mp3', 'rb') as file:
-            audio_bytes = file.read()
-        os.remove('speech.mp3')  # Clean up
+        audio_bytes = response['AudioStream'].read()
+        _tts_cache.set(cache_key, audio_bytes)
         return audio_bytes
     else:
         logger.error("Speech synthesis failed")
         return None
-    
+
+def tts_cache_stats():
+    stats = _tts_cache.stats()
+    with _tts_stats_lock:
+        stats["bytes_saved"] = _tts_bytes_saved
+    return stats
+
+
+# Generated reviews are fictional, so one set per hotel is reused for the cache lifetime
+_generated_reviews_cache = TTLCache(REVIEWS_CACHE_MAX_ENTRIES, ttl=REVIEW_SUMMARY_CACHE_TTL)
 
 def generate_llm_reviews(hotel_name, location):
+    cached = _generated_reviews_cache.get((hotel_name, location))
+    if cached is not None:
+        return cached
     try:
-        session = boto3.Session()
-        bedrock_client = session.client('bedrock-runtime')
-
         prompt = f"""
         Generate fictional aggregated reviews for the hotel "{hotel_name}" in {location}. 
         The response should be in the following JSON format:
@@ -357,26 +401,10 @@ def generate_llm_reviews(hotel_name, location):
         Ensure the content is relevant to the hotel and location, and the reviews sound realistic.
         """
 
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        })
-
-        response = bedrock_client.invoke_model(
-            body=body,
-            modelId=AWS_CLAUDE_MODEL_ID,
-            accept='application/json',
-            contentType='application/json'
-        )
-
-        response_body = json.loads(response.get('body').read())
-        reviews = json.loads(response_body['content'][0]['text'])
+        # Generated reviews are only used in production, which always runs on Bedrock
+        provider = get_provider(backend='bedrock')
+        reviews = json.loads(provider.complete(prompt, LLM_MAX_TOKENS['generated_reviews']))
+        _generated_reviews_cache.set((hotel_name, location), reviews)
 
         return reviews
 
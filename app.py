@@ -3,7 +3,7 @@ from config import LOGO_PATH, DEFAULT_MODE, BYPASS_LOGIN, BYPASS_USERNAME, ICON_
 from auth import init_session_state, login, logout
 from chat import start_chat, start_voice_chat
 from ui_components import render_sidebar, set_custom_css
-from user_profile import load_user_profile
+from user_profile import load_user_profile, profile_version
 from emergency_services import emergency_contacts_page
 from flight_search import flight_search_page
 from image_search import image_search_page  # Import the new image_search_page function
@@ -29,6 +29,12 @@ def main():
             st.session_state.user_profile = load_user_profile(st.session_state.username)
 
     if st.session_state.logged_in:
+        # Refresh the session's copy of the profile if it was saved since it was loaded
+        version = (st.session_state.username, profile_version(st.session_state.username))
+        if st.session_state.get("user_profile_version") != version:
+            st.session_state.user_profile = load_user_profile(st.session_state.username)
+            st.session_state.user_profile_version = version
+
         render_sidebar()
         set_custom_css()
         
@@ -0,0 +1,139 @@
+import logging
+import queue
+import numpy as np
+from config import (STT_SAMPLE_RATE, VAD_FRAME_MS, VAD_THRESHOLD_DB, VAD_NOISE_MARGIN_DB, VAD_END_SILENCE_MS,
+                    VAD_PADDING_MS, VAD_NO_SPEECH_TIMEOUT, VAD_MAX_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+def frame_energy_db(frame):
+    rms = np.sqrt(np.mean(np.square(frame, dtype=np.float64)))
+    return 20 * np.log10(max(rms, 1e-10))
+
+class RingBuffer:
+    """Fixed-size NumPy ring buffer holding the most recent samples."""
+
+    def __init__(self, size):
+        self._data = np.zeros(size, dtype=np.float32)
+        self._start = 0
+        self._length = 0
+
+    def extend(self, samples):
+        samples = samples[-len(self._data):]
+        end = (self._start + self._length) % len(self._data)
+        first = min(len(samples), len(self._data) - end)
+        self._data[end:end + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        overflow = max(0, self._length + len(samples) - len(self._data))
+        self._start = (self._start + overflow) % len(self._data)
+        self._length = min(len(self._data), self._length + len(samples))
+
+    def get(self):
+        end = self._start + self._length
+        if end <= len(self._data):
+            return self._data[self._start:end].copy()
+        return np.concatenate((self._data[self._start:], self._data[:end - len(self._data)]))
+
+class EnergyVAD:
+    """Frame-level speech detector: a frame is speech if it is above both the absolute
+    threshold and the running noise floor plus a margin.
+
+    The noise floor starts at the absolute threshold rather than the first
+    frame, so a speaker who is already talking when capture starts is not
+    taken for background noise. It then follows quiet frames quickly and loud
+    frames slowly, so it adapts to the room without absorbing the voice.
+    """
+
+    def __init__(self, threshold_db=VAD_THRESHOLD_DB, noise_margin_db=VAD_NOISE_MARGIN_DB):
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.noise_floor_db = threshold_db
+
+    def is_speech(self, frame):
+        energy = frame_energy_db(frame)
+        speech = energy > self.threshold_db and energy > self.noise_floor_db + self.noise_margin_db
+        rate = 0.01 if speech else 0.1
+        self.noise_floor_db += rate * (energy - self.noise_floor_db)
+        return speech
+
+def capture_utterance(frames, samplerate=STT_SAMPLE_RATE, end_silence_ms=VAD_END_SILENCE_MS,
+                      padding_ms=VAD_PADDING_MS, no_speech_timeout=VAD_NO_SPEECH_TIMEOUT, max_seconds=VAD_MAX_SECONDS, vad=None):
+    """Consume float32 frames until the speaker stops and return the utterance with silence trimmed.
+
+    Before speech starts only the last padding_ms of audio is kept (in a ring
+    buffer). Capture ends after end_silence_ms of silence following speech,
+    after no_speech_timeout seconds without any speech, or at max_seconds.
+    Returns an empty array if no speech was heard.
+    """
+    vad = vad or EnergyVAD()
+    padding = int(samplerate * padding_ms / 1000)
+    preroll = RingBuffer(max(padding, 1))
+    recorded = []
+    recorded_samples = 0
+    last_speech_end = None
+    silence_ms = 0.0
+    elapsed_ms = 0.0
+
+    for frame in frames:
+        frame = np.asarray(frame, dtype=np.float32).reshape(-1)
+        frame_duration_ms = len(frame) * 1000 / samplerate
+        elapsed_ms += frame_duration_ms
+        speech = vad.is_speech(frame)
+
+        if last_speech_end is None:
+            if speech:
+                lead = preroll.get()
+                recorded = [lead, frame]
+                recorded_samples = len(lead) + len(frame)
+                last_speech_end = recorded_samples
+            else:
+                preroll.extend(frame)
+                if elapsed_ms >= no_speech_timeout * 1000:
+                    logger.info("No speech detected before timeout")
+                    return np.zeros(0, dtype=np.float32)
+        else:
+            recorded.append(frame)
+            recorded_samples += len(frame)
+            if speech:
+                last_speech_end = recorded_samples
+                silence_ms = 0.0
+            else:
+                silence_ms += frame_duration_ms
+                if silence_ms >= end_silence_ms:
+                    break
+        if elapsed_ms >= max_seconds * 1000:
+            break
+
+    if last_speech_end is None:
+        return np.zeros(0, dtype=np.float32)
+    audio = np.concatenate(recorded)
+    # Trim trailing silence down to the padding
+    return audio[:min(len(audio), last_speech_end + padding)]
+
+def microphone_frames(samplerate=STT_SAMPLE_RATE, frame_ms=VAD_FRAME_MS):
+    """Yield mono float32 frames from the default input device until the consumer stops iterating."""
+    import sounddevice as sd
+
+    frames = queue.Queue()
+
+    def callback(indata, frame_count, time_info, status):
+        if status:
+            logger.warning(f"Audio input status: {status}")
+        frames.put(indata[:, 0].copy())
+
+    blocksize = int(samplerate * frame_ms / 1000)
+    with sd.InputStream(samplerate=samplerate, channels=1, dtype='float32', blocksize=blocksize, callback=callback):
+        while True:
+            try:
+                yield frames.get(timeout=2)
+            except queue.Empty:
+                logger.error("No audio received from the input device")
+                return
+
+def record_utterance(samplerate=STT_SAMPLE_RATE):
+    frames = microphone_frames(samplerate)
+    try:
+        return capture_utterance(frames, samplerate)
+    finally:
+        # Closing the generator leaves the InputStream context and stops the device
+        frames.close()
@@ -2,11 +2,15 @@ import streamlit as st
 import json
 import bcrypt
 import logging
-from config import USERS_FILE, LOGO_PATH, DEFAULT_MODE
+from config import USERS_FILE, LOGO_PATH, DEFAULT_MODE, BCRYPT_ROUNDS, USERS_INDEX_CHECK_INTERVAL, TRUSTED_PROXY_HOPS
 from user_profile import load_user_profile
+from user_store import UserIndex
+from login_guard import check_password, LoginRateLimitError, LoginBusyError
 
 logger = logging.getLogger(__name__)
 
+user_index = UserIndex(USERS_FILE, BCRYPT_ROUNDS, check_interval=USERS_INDEX_CHECK_INTERVAL)
+
 def init_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -25,14 +29,37 @@ def init_session_state():
     if "page" not in st.session_state:
         st.session_state.page = "image_search"  # Default page is chat
         
+def get_client_ip():
+    """Client IP for the per-IP login limit, or None when it cannot be determined.
+
+    Behind TRUSTED_PROXY_HOPS proxies the address is the X-Forwarded-For entry
+    appended by the outermost trusted proxy, counted from the right; entries
+    further left are set by the client and could be changed on every attempt.
+    Without trusted proxies the socket peer address is used.
+    """
+    try:
+        if hasattr(st, "context"):
+            headers = st.context.headers
+            peer = getattr(st.context, "ip_address", None)
+        else:
+            from streamlit.web.server.websocket_headers import _get_websocket_headers
+            headers = _get_websocket_headers()
+            peer = None
+    except Exception as e:
+        logger.debug(f"Could not read request headers: {str(e)}")
+        return None
+    if TRUSTED_PROXY_HOPS <= 0 or not headers:
+        return peer
+    forwarded_for = [entry.strip() for entry in headers.get("X-Forwarded-For", "").split(",") if entry.strip()]
+    if forwarded_for:
+        return forwarded_for[-min(TRUSTED_PROXY_HOPS, len(forwarded_for))]
+    return headers.get("X-Real-Ip") or peer
+
 def authenticate(username, password):
     try:
-        with open(USERS_FILE, 'r') as f:
-            users = json.load(f)["users"]
-        for user in users:
-            if user["username"] == username and bcrypt.checkpw(password.encode('utf-8'), user["password"].encode('utf-8')):
-                return True
-        return False
+        return check_password(user_index.verify, username, password, get_client_ip())
+    except (LoginRateLimitError, LoginBusyError):
+        raise
     except Exception as e:
         logger.error(f"Authentication error: {str(e)}")
         st.error("An error occurred during authentication. Please try again.")
@@ -45,7 +72,12 @@ def login():
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
     if st.button("Login"):
-        if authenticate(username, password):
+        try:
+            authenticated = authenticate(username, password)
+        except (LoginRateLimitError, LoginBusyError) as e:
+            st.error(str(e))
+            return
+        if authenticated:
             st.session_state.logged_in = True
             st.session_state.username = username
             st.session_state.user_profile = load_user_profile(username)
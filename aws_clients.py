@@ -0,0 +1,46 @@
+import logging
+import threading
+import boto3
+from botocore.config import Config
+from config import AWS_REGION, AWS_MAX_POOL_CONNECTIONS, AWS_CONNECT_TIMEOUT, AWS_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+# Shared by every client: a larger connection pool for the worker pools and
+# TCP keep-alive so idle connections are reused rather than re-negotiated
+_client_config = Config(
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+)
+
+# Throttling and connection setup errors on Bedrock are retried by resilience.call_llm, so botocore must not retry them as well
+_service_configs = {
+    'bedrock-runtime': _client_config.merge(Config(retries={'mode': 'standard', 'total_max_attempts': 1})),
+}
+
+def get_client(service, region_name=None):
+    """Return the process-wide boto3 client for a service and region.
+
+    Credentials are resolved once for the shared session and each client is
+    created on first use, so hot paths never pay for session setup or new
+    TLS handshakes. boto3 clients are thread-safe and can be shared freely.
+    """
+    global _session
+    key = (service, region_name or AWS_REGION)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                if _session is None:
+                    _session = boto3.Session()
+                client = _session.client(service, region_name=key[1], config=_service_configs.get(service, _client_config))
+                _clients[key] = client
+                logger.info(f"Created {service} client for region {key[1]}")
+    return client
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries expire after ttl seconds.
+
+    A ttl of None keeps entries until they are evicted by size.
+    """
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+class DiskCache:
+    """Thread-safe on-disk LRU cache for bytes values, bounded by total size.
+
+    Each entry is a file named after the SHA-256 of its key. Reads refresh the
+    file mtime, and the least recently used files are removed once the
+    directory holds more than max_bytes. Writes go through a temp file and
+    rename so a crash never leaves a truncated entry behind.
+    """
+
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()
+        entries = []
+        for name in os.listdir(directory):
+            if not name.endswith('.bin'):
+                continue
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._sizes[name] = size
+        self._total = sum(self._sizes.values())
+
+    def _name(self, key):
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + '.bin'
+
+    def get(self, key):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name in self._sizes:
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    os.utime(path)
+                    self._sizes.move_to_end(name)
+                    self.hits += 1
+                    return data
+                except OSError as e:
+                    logger.warning(f"Disk cache read failed for {name}: {str(e)}")
+                    self._total -= self._sizes.pop(name)
+            self.misses += 1
+            return None
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Disk cache write failed for {name}: {str(e)}")
+                return
+            self._total += len(data) - self._sizes.pop(name, 0)
+            self._sizes[name] = len(data)
+            while self._total > self.max_bytes and self._sizes:
+                old_name, size = self._sizes.popitem(last=False)
+                self._total -= size
+                try:
+                    os.remove(os.path.join(self.directory, old_name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._sizes),
+                "bytes": self._total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -1,12 +1,18 @@
 import streamlit as st
-from config import API_MODE, USE_GOOGLE_MAPS, LOGO_PATH, IS_PRODUCTION
-from api_client import invoke_model, initialize_api_client, transcribe_audio, synthesize_speech,generate_llm_reviews
-from map_utils import extract_locations_llm, create_map, extract_place_info_llm, get_random_local_photo, create_aws_location_map,create_aws_location_map_embed
+from config import API_MODE, USE_GOOGLE_MAPS, LOGO_PATH, IS_PRODUCTION, VOICE_CAPTURE_MODE
+from api_client import invoke_model, invoke_model_stream, invoke_model_stream_cached, initialize_api_client, transcribe_audio_stream, ERROR_MESSAGE
+from map_utils import create_map, create_aws_location_map,create_aws_location_map_embed
 from ui_components import set_custom_carousel_css
 from streamlit_folium import folium_static
 import folium
 import streamlit.components.v1 as components
-from google_reviews import get_hotel_reviews_summary, get_place_photo
+from google_reviews import get_place_photo_bytes, prefetch_place_photos
+from image_pipeline import get_variant
+from photo_catalog import photo_catalog, get_local_photo
+from enrichment import start_enrichment, fetch_reviews
+from chat_context import get_chat_context
+from text_to_speech import SpeechPipeline, audio_player_html
+from audio_capture import record_utterance
 import json
 import logging
 from PIL import Image
@@ -29,6 +35,9 @@ def hide_map_callback():
 def select_location(index):
     st.session_state.selected_location = index
 
+def step_image_index(key, step, count):
+    st.session_state[key] = (st.session_state.get(key, 0) + step) % count
+
 def image_to_base64(img):
     import io
     import base64
@@ -59,6 +68,8 @@ def initialize_session_state():
         st.session_state.helper_buttons_displayed = False
     if "button_results" not in st.session_state:
         st.session_state.button_results = {}
+    if "enrichment" not in st.session_state:
+        st.session_state.enrichment = None
 
 def button_click(button_type):
     st.session_state.selected_button = button_type
@@ -76,33 +87,63 @@ def start_voice_chat():
         
         if st.button("Start Recording", key="start_recording"):
             with st.spinner("Recording... Speak now"):
-                audio_data = record_audio(duration=5)  # Record for 5 seconds
-            
+                if VOICE_CAPTURE_MODE == 'vad':
+                    # Stops shortly after the speaker finishes, with leading and trailing silence trimmed
+                    audio_data = record_utterance()
+                else:
+                    audio_data = record_audio(duration=5)  # Record for 5 seconds
+            if len(audio_data) == 0:
+                st.warning("I didn't hear anything. Please try again.")
+                return
+
+            # Show partial transcripts as they stream in; finished segments are kept and joined
+            transcript_placeholder = st.empty()
+            final_segments = []
+            try:
+                for event in transcribe_audio_stream(audio_data):
+                    if event.is_final:
+                        final_segments.append(event.text.strip())
+                        transcript_placeholder.text(f"You said: {' '.join(final_segments)}")
+                    else:
+                        transcript_placeholder.text(f"You said: {' '.join(final_segments + [event.text.strip()])}")
+            except Exception as e:
+                logger.error(f"Transcription failed: {str(e)}")
+                st.error("Sorry, I couldn't transcribe that. Please try again.")
+                return
+            text = " ".join(segment for segment in final_segments if segment)
+            if not text:
+                st.warning("I didn't catch that. Please try again.")
+                return
+
+            st.text("AI Response:")
+            # Hidden players for each synthesised sentence; clips queue up in the page and play in order
+            audio_container = st.container()
+            speech = SpeechPipeline()
+            first_clip = True
+
+            def play(audio_bytes):
+                nonlocal first_clip
+                with audio_container:
+                    components.html(audio_player_html(audio_bytes, reset=first_clip), height=0)
+                first_clip = False
+
+            def speak_while_streaming(chunks):
+                for chunk in chunks:
+                    speech.feed(chunk)
+                    for audio_bytes in speech.ready():
+                        play(audio_bytes)
+                    yield chunk
+                speech.close()
+
+            response = st.write_stream(speak_while_streaming(
+                invoke_model_stream(text, st.session_state.api_client, st.session_state.user_profile)
+            ))
+            for audio_bytes in speech.remaining():
+                play(audio_bytes)
+
             with st.spinner("Processing your request..."):
-                text = transcribe_audio(audio_data)
-                st.text(f"You said: {text}")
-                
-                response = invoke_model(text, st.session_state.api_client, st.session_state.user_profile)
-                st.text("AI Response:")
-                st.write(response)
-                
-                audio_response = synthesize_speech(response)
-                
-                # Convert audio to base64
-                audio_base64 = base64.b64encode(audio_response).decode()
-                
-                # Create an HTML audio element with autoplay
-                audio_html = f"""
-                    <audio autoplay="true">
-                        <source src="data:audio/mp3;base64,{audio_base64}" type="audio/mp3">
-                        Your browser does not support the audio element.
-                    </audio>
-                """
-                
-                # Display the audio element
-                st.components.v1.html(audio_html, height=50)
-                
-                locations = extract_locations_llm(response, st.session_state.api_client)
+                st.session_state.enrichment = start_enrichment(response, st.session_state.api_client)
+                locations, _ = st.session_state.enrichment.travel_info()
                 if locations:
                     st.session_state.locations = locations
                     display_map_and_reviews()
@@ -125,7 +166,7 @@ def should_display_helper_buttons(place_info, full_response):
         return any(keyword in full_response.lower() for keyword in planning_keywords)
 
 def handle_button_click(button_type, location):
-    context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in st.session_state.chat_history[-5:]])
+    context = get_chat_context()
     
     prompts = {
         "restaurants": f"Based on the following conversation context and the location {location}, provide information about popular restaurants nearby:\n\n{context}",
@@ -159,15 +200,6 @@ def display_helper_buttons(location):
             if st.button(button, key=unique_key):
                 button_click(button.lower())
 
-def get_chat_context():
-    context = []
-    for msg in st.session_state.chat_history[-10:]:  # Get last 10 messages
-        if msg['role'] == 'user':
-            context.append(f"User: {msg['content']}")
-        elif msg['role'] == 'assistant':
-            context.append(f"TravelEase: {msg['content']}")
-    return "\n".join(context)
-
 def display_debug_info(context):
     st.sidebar.subheader("Debug Information")
     st.sidebar.text("Current Context:")
@@ -207,46 +239,43 @@ def display_image_carousel(photos, hotel_name):
         # Display current image
         with st.spinner("Loading image..."):
             photo_reference = photos[image_index]
-            image_data = get_place_photo(photo_reference)
+            image_data = get_variant(('place_photo', photo_reference, 800), lambda: get_place_photo_bytes(photo_reference, 800))
             if image_data:
-                st.markdown(f"""
-                <div class="image-container">
-                    <img src="data:image/jpeg;base64,{image_data}">
-                </div>
-                <p style="text-align: center;">Image {image_index + 1} of {len(photos)}</p>
-                """, unsafe_allow_html=True)
+                # st.image serves the bytes from Streamlit's media endpoint instead of inlining a data URI
+                st.image(image_data, caption=f"Image {image_index + 1} of {len(photos)}", use_column_width="auto")
             else:
                 st.write("Failed to load image.")
 
-        # Use a form for the buttons
+        # Warm the neighbouring photos so Previous/Next render from cache
+        if len(photos) > 1:
+            prefetch_place_photos([photos[(image_index + 1) % len(photos)], photos[(image_index - 1) % len(photos)]])
+
+        # Use a form for the buttons; the callbacks update the index before the rerun
         with st.form(key=f"nav_form_{hotel_name}"):
             col1, col2 = st.columns([1, 1])
             with col1:
-                prev_button = st.form_submit_button("Previous")
+                st.form_submit_button("Previous", on_click=step_image_index, args=(f"image_index_{hotel_name}", -1, len(photos)))
             with col2:
-                next_button = st.form_submit_button("Next")
-            
-            # Handle button clicks
-            if prev_button:
-                st.session_state[f"image_index_{hotel_name}"] = (image_index - 1) % len(photos)
-                st.experimental_rerun()
-            elif next_button:
-                st.session_state[f"image_index_{hotel_name}"] = (image_index + 1) % len(photos)
-                st.experimental_rerun()
+                st.form_submit_button("Next", on_click=step_image_index, args=(f"image_index_{hotel_name}", 1, len(photos)))
 
 def display_reviews():
     # Reviews section
     st.header("Location Reviews and Insights")
     selected_hotel = st.selectbox("Select a hotel to view detailed reviews", st.session_state.locations)
     if selected_hotel:
-        if IS_PRODUCTION:
-            reviews = generate_llm_reviews(selected_hotel, selected_hotel)
-        else:
-            reviews = get_hotel_reviews_summary(selected_hotel, st.session_state.api_client, location=selected_hotel)
+        enrichment = st.session_state.get("enrichment")
+        with st.spinner("Loading reviews..."):
+            if enrichment:
+                reviews = enrichment.reviews(selected_hotel)
+            else:
+                reviews = fetch_reviews(selected_hotel, st.session_state.api_client)
+        if not reviews and enrichment and enrichment.reviews_pending(selected_hotel):
+            st.info("Reviews for this location are still loading. They will appear on the next refresh.")
+            return
         if reviews:
                 # Display image carousel
             if IS_PRODUCTION:
-                display_image_carousel_local(5, reviews['name'])  # Display 5 random local images
+                display_image_carousel_local(5, reviews['name'], selected_hotel)  # Display 5 local images matching the destination
             else:
                 display_image_carousel(reviews.get('photos', []), reviews['name'])
 
@@ -288,12 +317,14 @@ def display_map_and_reviews():
     
     with col2:
         # st.subheader("Interactive Map")
+        enrichment = st.session_state.get("enrichment")
+        coordinates = enrichment.coordinates(st.session_state.locations) if enrichment else None
         if IS_PRODUCTION:
-            content_type, map_data = create_aws_location_map_embed(st.session_state.locations)
+            content_type, map_data = create_aws_location_map_embed(st.session_state.locations, coordinates) or (None, None)
             logger.info(f"content_type_{content_type}")
             logger.info(f"map_data_{map_data}")
         else:
-            map_data = create_map(st.session_state.locations)
+            map_data = create_map(st.session_state.locations, coordinates)
             
         if map_data:
             if IS_PRODUCTION:
@@ -363,7 +394,8 @@ def display_map_and_reviews():
     
 
 
-def display_image_carousel_local(num_photos, hotel_name):
+def display_image_carousel_local(num_photos, hotel_name, destination=None):
+    num_photos = min(num_photos, len(photo_catalog.matching(destination)))
     if num_photos <= 0:
         st.write("No photos available for this location.")
         return
@@ -381,35 +413,22 @@ def display_image_carousel_local(num_photos, hotel_name):
     with st.container():
         # Display current image
         with st.spinner("Loading image..."):
-            image_data = get_random_local_photo()
+            image_data = get_local_photo(destination, image_index, seed=hotel_name)
             if image_data:
-                st.markdown(f"""
-                <div class="image-container">
-                    <img src="data:image/jpeg;base64,{image_data}">
-                </div>
-                <p style="text-align: center;">Image {image_index + 1} of {num_photos}</p>
-                """, unsafe_allow_html=True)
+                st.image(image_data, caption=f"Image {image_index + 1} of {num_photos}", use_column_width="auto")
             else:
                 st.write("Failed to load image.")
 
-        # Use a form for the buttons
+        # Use a form for the buttons; the callbacks update the index before the rerun
         with st.form(key=f"nav_form_{hotel_name}"):
             col1, col2 = st.columns([1, 1])
             with col1:
-                prev_button = st.form_submit_button("Previous")
+                st.form_submit_button("Previous", on_click=step_image_index, args=(f"image_index_{hotel_name}", -1, num_photos))
             with col2:
-                next_button = st.form_submit_button("Next")
-            
-            # Handle button clicks
-            if prev_button:
-                st.session_state[f"image_index_{hotel_name}"] = (image_index - 1) % num_photos
-                st.experimental_rerun()
-            elif next_button:
-                st.session_state[f"image_index_{hotel_name}"] = (image_index + 1) % num_photos
-                st.experimental_rerun()
+                st.form_submit_button("Next", on_click=step_image_index, args=(f"image_index_{hotel_name}", 1, num_photos))
 
 def display_follow_up_question():
-    context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in st.session_state.chat_history[-5:]])
+    context = get_chat_context()
     follow_up_prompt = f"""You are a Travel Assistant Chatbot. You dont need to introduce yourself. Based on the following conversation context, generate a relevant follow-up question that continues the discussion about the mentioned locations or the user's travel plans. The question should be specific to the conversation and encourage further engagement:
 
     {context}
@@ -453,24 +472,18 @@ def start_chat():
             with col1:
                 if st.button("Plan a new Trip"):
                     with results_container:
-                        with st.spinner("Planning your new trip.."):
-                            trip_info = invoke_model("Plan a new trip based on his user profile, preferences", st.session_state.api_client, st.session_state.user_profile)
-                            st.markdown("### Plan a new Trip")
-                            st.write(trip_info)
+                        st.markdown("### Plan a new Trip")
+                        st.write_stream(invoke_model_stream_cached("Plan a new trip based on his user profile, preferences", st.session_state.api_client, st.session_state.user_profile))
             with col2:
                 if st.button("My Offers"):
                     with results_container:
-                        with st.spinner("Fetching your credit card offers..."):
-                            offer_info = invoke_model("Summarize the offers on my credit cards", st.session_state.api_client, st.session_state.user_profile)
-                            st.markdown("### My Offers")
-                            st.write(offer_info)
+                        st.markdown("### My Offers")
+                        st.write_stream(invoke_model_stream_cached("Summarize the offers on my credit cards", st.session_state.api_client, st.session_state.user_profile))
             with col3:
                 if st.button("My Trips"):
                     with results_container:
-                        with st.spinner("Fetching your card details..."):
-                            card_info = invoke_model("Summarize my past and future trips", st.session_state.api_client, st.session_state.user_profile)
-                            st.markdown("### My Trips")
-                            st.write(card_info)
+                        st.markdown("### My Trips")
+                        st.write_stream(invoke_model_stream_cached("Summarize my past and future trips", st.session_state.api_client, st.session_state.user_profile))
             st.markdown('</div>', unsafe_allow_html=True)
         
         # Add some space between the results and the chat history
@@ -510,40 +523,40 @@ def start_chat():
             # Add user message to chat history
             st.session_state.chat_history.append({"role": "user", "content": user_input})
 
-            with st.spinner("Thinking..."):
-                try:
-                    # Prepare context from recent chat history
-                    context = get_chat_context()
-                    
-                    # Display debug information if in developer mode
-                    # if developer_mode:
-                    #     display_debug_info(context)
+            try:
+                # Prepare context from recent chat history
+                context = get_chat_context()
+                
+                # Display debug information if in developer mode
+                # if developer_mode:
+                #     display_debug_info(context)
 
-                    full_response = invoke_model(user_input, st.session_state.api_client, st.session_state.user_profile, context=context)
-                    
-                    # Display assistant response
-                    with st.chat_message("assistant", avatar=icon):
-                        st.markdown(full_response)
-                    
-                    # Add assistant response to chat history
-                    st.session_state.chat_history.append({"role": "assistant", "content": full_response})
-                    
-                    locations = extract_locations_llm(full_response, st.session_state.api_client)
-                    place_info = extract_place_info_llm(full_response, st.session_state.api_client)
-                    
-                    st.session_state.locations = locations
-                    st.session_state.place_info = place_info
-                    
-                except Exception as e:
-                    logger.error(f"Error during chat: {str(e)}")
-                    error_message = "TravelEase: I apologize, but I encountered an error while processing your request. Please try again."
-                    
-                    # Display error message
-                    with st.chat_message("assistant", avatar=icon):
-                        st.markdown(error_message)
-                    
-                    # Add error message to chat history
-                    st.session_state.chat_history.append({"role": "assistant", "content": error_message})
+                # Stream the assistant response as it is generated
+                with st.chat_message("assistant", avatar=icon):
+                    full_response = st.write_stream(invoke_model_stream(user_input, st.session_state.api_client, st.session_state.user_profile, context=context))
+                
+                # Add assistant response to chat history
+                st.session_state.chat_history.append({"role": "assistant", "content": full_response})
+                
+                # Extraction, geocoding and reviews run on the enrichment pool;
+                # the panels below pick up results as they complete
+                st.session_state.enrichment = start_enrichment(full_response, st.session_state.api_client)
+                with st.spinner("Finding locations..."):
+                    locations, place_info = st.session_state.enrichment.travel_info()
+                
+                st.session_state.locations = locations
+                st.session_state.place_info = place_info
+                
+            except Exception as e:
+                logger.error(f"Error during chat: {str(e)}")
+                error_message = ERROR_MESSAGE
+                
+                # Display error message
+                with st.chat_message("assistant", avatar=icon):
+                    st.markdown(error_message)
+                
+                # Add error message to chat history
+                st.session_state.chat_history.append({"role": "assistant", "content": error_message})
                     
         # Display helper buttons and results
         if should_display_helper_buttons(st.session_state.place_info, st.session_state.chat_history[-1]["content"] if st.session_state.chat_history else ""):
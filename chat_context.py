@@ -0,0 +1,80 @@
+import logging
+import streamlit as st
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARY_TOKENS
+from api_client import summarize_conversation
+
+logger = logging.getLogger(__name__)
+
+ROLE_LABELS = {"user": "User", "assistant": "TravelEase"}
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text, close enough for budgeting
+    return len(text) // 4 + 1
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+def format_message(message):
+    return f"{ROLE_LABELS.get(message['role'], message['role'])}: {message['content']}"
+
+def _update_summary(history, covered, state, summarize):
+    """Fold history[:covered] into the summary cached in state.
+
+    Only messages not already folded in are sent to summarize, so the summary
+    is updated incrementally and only when new turns leave the window.
+    """
+    summary = state.get("context_summary")
+    if not summary or summary["upto"] > len(history):
+        summary = {"upto": 0, "text": ""}
+    if covered > summary["upto"]:
+        new_turns = "\n".join(format_message(message) for message in history[summary["upto"]:covered])
+        text = summarize(summary["text"], new_turns) if summarize else None
+        if not text:
+            # Without a summarizer keep the tail of the dropped turns instead
+            text = (summary["text"] + "\n" + new_turns).strip()
+            text = text[-CONTEXT_SUMMARY_TOKENS * 4:]
+        summary = {"upto": covered, "text": truncate_to_tokens(text, CONTEXT_SUMMARY_TOKENS)}
+        state["context_summary"] = summary
+    return summary
+
+def build_chat_context(history, state, summarize=None, budget=CONTEXT_TOKEN_BUDGET):
+    """Build the conversation context for a prompt within a token budget.
+
+    The newest messages are kept verbatim (long ones truncated) until the
+    budget minus the summary allowance is used; older messages are
+    represented by a running summary kept in state.
+    """
+    recent_budget = budget - CONTEXT_SUMMARY_TOKENS
+    message_cap = max(recent_budget // 2, 1)
+    summary = state.get("context_summary")
+    already_summarized = summary["upto"] if summary and summary["upto"] <= len(history) else 0
+
+    recent = []
+    used = 0
+    covered = len(history)
+    for index in range(len(history) - 1, already_summarized - 1, -1):
+        line = truncate_to_tokens(format_message(history[index]), message_cap)
+        cost = estimate_tokens(line)
+        if used + cost > recent_budget:
+            break
+        recent.append(line)
+        used += cost
+        covered = index
+    recent.reverse()
+
+    if covered > 0:
+        summary = _update_summary(history, covered, state, summarize)
+        if summary["text"]:
+            recent.insert(0, f"Summary of earlier conversation: {summary['text']}")
+    return "\n".join(recent)
+
+def get_chat_context():
+    """Context for the current session's chat history, shared by every prompt builder."""
+    api_client = st.session_state.get("api_client")
+    summarize = None
+    if api_client:
+        summarize = lambda previous, new_turns: summarize_conversation(previous, new_turns, api_client)
+    return build_chat_context(st.session_state.get("chat_history", []), st.session_state, summarize)
@@ -6,7 +6,24 @@ load_dotenv()
 
 # Constants
 USERS_FILE = 'users.json'
+# bcrypt cost for new and upgraded password hashes; hashes with a different cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+USERS_INDEX_CHECK_INTERVAL = float(os.getenv('USERS_INDEX_CHECK_INTERVAL', '2'))  # seconds between users file mtime checks
+# Password checks run on a bounded pool off the Streamlit script thread, behind per-user and per-IP limits
+LOGIN_VERIFY_WORKERS = int(os.getenv('LOGIN_VERIFY_WORKERS', '2'))
+LOGIN_MAX_QUEUE = int(os.getenv('LOGIN_MAX_QUEUE', '32'))  # verifications waiting or running before new logins are turned away
+LOGIN_VERIFY_TIMEOUT = float(os.getenv('LOGIN_VERIFY_TIMEOUT', '10'))  # seconds
+LOGIN_RATE_WINDOW = float(os.getenv('LOGIN_RATE_WINDOW', '300'))  # seconds
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv('LOGIN_MAX_FAILURES_PER_USER', '5'))
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv('LOGIN_MAX_ATTEMPTS_PER_IP', '20'))
+# Reverse proxies in front of the app that append to X-Forwarded-For; with 0 the header is ignored since clients can forge it
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+LOGIN_METRICS_LOG_INTERVAL = float(os.getenv('LOGIN_METRICS_LOG_INTERVAL', '300'))  # seconds between login metrics log lines
 USER_PROFILES_FILE = 'user_profiles.json'
+# SQLite store the profiles live in; USER_PROFILES_FILE is imported into it once
+USER_PROFILES_DB = os.getenv('USER_PROFILES_DB', 'user_profiles.db')
+PROFILE_DB_BUSY_TIMEOUT = float(os.getenv('PROFILE_DB_BUSY_TIMEOUT', '10'))  # seconds to wait for another writer
+PROFILE_WRITE_BATCH_WINDOW = float(os.getenv('PROFILE_WRITE_BATCH_WINDOW', '0.01'))  # seconds to gather writes into one commit
 LOGO_PATH = "images/ease.png"
 ICON_PATH = "images/icon.png"
 CLAUDE_MODEL_ID = "claude-3-5-sonnet-20240620"
@@ -98,4 +115,130 @@ AWS_LOCATION_SERVICE_PLACE_INDEX = os.getenv('AWS_LOCATION_SERVICE_PLACE_INDEX')
 LOCAL_PHOTOS_DIR = 'photos'
 # AWS Location Service configuration
 AWS_LOCATION_SERVICE_MAP_NAME = os.getenv('AWS_LOCATION_SERVICE_MAP_NAME')
-AWS_MAP_API_KEY= os.getenv('AWS_MAP_API_KEY')
\ No newline at end of file
+AWS_MAP_API_KEY= os.getenv('AWS_MAP_API_KEY')
+
+# Post-response enrichment (extraction, geocoding, reviews) worker pool and per-stage timeouts in seconds
+ENRICHMENT_MAX_WORKERS = int(os.getenv('ENRICHMENT_MAX_WORKERS', '8'))
+ENRICHMENT_TIMEOUTS = {
+    'extraction': float(os.getenv('EXTRACTION_TIMEOUT', '30')),
+    'geocoding': float(os.getenv('GEOCODING_TIMEOUT', '10')),
+    'reviews': float(os.getenv('REVIEWS_TIMEOUT', '20')),
+}
+
+# Local cache directory for persistent caches
+CACHE_DIR = os.getenv('CACHE_DIR', '.cache')
+
+# Geocoding cache shared by all get_coordinates backends
+GEOCODE_CACHE_PATH = os.path.join(CACHE_DIR, 'geocode.sqlite3')
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))  # seconds
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', '10000'))
+GEOCODE_BATCH_WORKERS = int(os.getenv('GEOCODE_BATCH_WORKERS', '8'))
+
+# Shared boto3 client settings
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '32'))
+AWS_CONNECT_TIMEOUT = int(os.getenv('AWS_CONNECT_TIMEOUT', '10'))
+AWS_READ_TIMEOUT = int(os.getenv('AWS_READ_TIMEOUT', '120'))
+
+# Prompt caching for the static VOYAGE_PROMPT + user profile prefix
+PROFILE_PROMPT_CACHE_SIZE = int(os.getenv('PROFILE_PROMPT_CACHE_SIZE', '256'))
+ANTHROPIC_PROMPT_CACHING = os.getenv('ANTHROPIC_PROMPT_CACHING', 'True').lower() == 'true'
+# Only enable for Bedrock models that support prompt caching
+BEDROCK_PROMPT_CACHING = os.getenv('BEDROCK_PROMPT_CACHING', 'False').lower() == 'true'
+
+# Process-wide cache for fixed quick-action prompts (Plan a new Trip, My Offers, My Trips)
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', str(6 * 3600)))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+
+# Conversation context sent with each prompt, in estimated tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '2000'))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', '300'))
+
+# Resilience for LLM calls: retries with jittered backoff on throttling, per-backend circuit breaker and concurrency limit
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))  # seconds
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))  # in-flight calls per backend
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '30'))  # seconds to wait for a free slot
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+LLM_CIRCUIT_RESET_TIMEOUT = float(os.getenv('LLM_CIRCUIT_RESET_TIMEOUT', '30'))  # seconds
+
+# max_tokens per kind of LLM call, shared by every backend
+LLM_MAX_TOKENS = {
+    'chat': int(os.getenv('CHAT_MAX_TOKENS', '4096')),
+    'classification': 200,
+    'extraction': 1000,
+    'review_summary': 500,
+    'conversation_summary': CONTEXT_SUMMARY_TOKENS,
+    'generated_reviews': 1000,
+    'image_analysis': 1000,
+}
+
+# GoogleReviews caches: place_id by query, place details by place_id, LLM summary by review text hash (TTLs in seconds)
+PLACE_ID_CACHE_TTL = int(os.getenv('PLACE_ID_CACHE_TTL', str(7 * 24 * 3600)))
+PLACE_DETAILS_CACHE_TTL = int(os.getenv('PLACE_DETAILS_CACHE_TTL', str(24 * 3600)))
+REVIEW_SUMMARY_CACHE_TTL = int(os.getenv('REVIEW_SUMMARY_CACHE_TTL', str(7 * 24 * 3600)))
+REVIEWS_CACHE_MAX_ENTRIES = int(os.getenv('REVIEWS_CACHE_MAX_ENTRIES', '1000'))
+
+# Place photo bytes keyed by (photo_reference, width): small in-memory LRU backed by a size-bounded disk cache
+PHOTO_CACHE_DIR = os.path.join(CACHE_DIR, 'photos')
+PHOTO_DISK_CACHE_MAX_BYTES = int(os.getenv('PHOTO_DISK_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+PHOTO_MEMORY_CACHE_ENTRIES = int(os.getenv('PHOTO_MEMORY_CACHE_ENTRIES', '64'))
+PHOTO_PREFETCH_WORKERS = int(os.getenv('PHOTO_PREFETCH_WORKERS', '4'))
+
+# Resized image variants served to the page instead of full-size base64 data URIs
+IMAGE_VARIANT_SIZES = {
+    'carousel': (800, 450),  # max width, max height in pixels
+    'thumbnail': (240, 160),
+}
+# st.image only passes PNG, GIF and JPEG through to the browser and re-encodes anything else as JPEG,
+# so WEBP only pays off where variants are served by URL; it falls back to JPEG if Pillow lacks WebP support
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'JPEG')
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', '80'))
+IMAGE_VARIANT_CACHE_DIR = os.path.join(CACHE_DIR, 'variants')
+IMAGE_VARIANT_CACHE_MAX_BYTES = int(os.getenv('IMAGE_VARIANT_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+
+# Local photo catalogue: rescanned when the directory mtime changes, checked at most this often (seconds)
+PHOTO_CATALOG_CHECK_INTERVAL = float(os.getenv('PHOTO_CATALOG_CHECK_INTERVAL', '5'))
+# File-name words found in more than this share of the photos are treated as generic rather than destinations
+PHOTO_GENERIC_WORD_SHARE = float(os.getenv('PHOTO_GENERIC_WORD_SHARE', '0.15'))
+# Optional JSON file in LOCAL_PHOTOS_DIR mapping file names to destination tags
+PHOTO_TAGS_FILE = 'tags.json'
+
+# Speech-to-text for voice mode: 'aws' streams to Amazon Transcribe (needs the amazon-transcribe package), 'local' is an offline stand-in
+STT_ENGINE = os.getenv('STT_ENGINE', 'aws')
+STT_LANGUAGE_CODE = os.getenv('STT_LANGUAGE_CODE', 'en-US')
+STT_SAMPLE_RATE = 16000
+STT_CHUNK_MS = int(os.getenv('STT_CHUNK_MS', '100'))  # audio sent per streaming event
+STT_LOCAL_TRANSCRIPT = os.getenv('STT_LOCAL_TRANSCRIPT', 'Plan a weekend trip to Paris')
+
+# Voice-mode speech synthesis: the streamed answer is split into sentences that are synthesised concurrently and played in order
+TTS_VOICE_ID = os.getenv('TTS_VOICE_ID', 'Joanna')
+TTS_OUTPUT_FORMAT = 'mp3'
+TTS_MAX_WORKERS = int(os.getenv('TTS_MAX_WORKERS', '4'))
+TTS_MIN_CHUNK_CHARS = int(os.getenv('TTS_MIN_CHUNK_CHARS', '40'))  # shorter sentences are merged with the next one
+TTS_MAX_CHUNK_CHARS = 1500  # well under Polly's 3000 character limit per request
+
+# Voice capture: record until the speaker stops (energy-based endpointing) instead of a fixed 5 seconds
+VOICE_CAPTURE_MODE = os.getenv('VOICE_CAPTURE_MODE', 'vad')  # 'vad' or 'fixed'
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', '-45'))  # frames quieter than this never count as speech (dBFS)
+VAD_NOISE_MARGIN_DB = float(os.getenv('VAD_NOISE_MARGIN_DB', '10'))  # speech must be this much louder than the measured noise floor
+VAD_END_SILENCE_MS = int(os.getenv('VAD_END_SILENCE_MS', '700'))  # trailing silence that ends the utterance
+VAD_PADDING_MS = 150  # silence kept before and after the speech when trimming
+VAD_NO_SPEECH_TIMEOUT = float(os.getenv('VAD_NO_SPEECH_TIMEOUT', '5'))  # seconds to wait for speech to start
+VAD_MAX_SECONDS = float(os.getenv('VAD_MAX_SECONDS', '20'))
+
+# Synthesised speech keyed by (normalised text hash, voice, format), LRU on disk
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, 'tts')
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Local flight ranking: offers are scored here and only the top FLIGHT_TOP_K are sent to the LLM for the write-up
+FLIGHT_TOP_K = int(os.getenv('FLIGHT_TOP_K', '3'))
+FLIGHT_RANKING_WEIGHTS = {
+    'price': 0.4,
+    'duration': 0.25,
+    'stops': 0.15,
+    'airline': 0.1,
+    'departure_time': 0.1,
+}
+FLIGHT_PREFERRED_DEPARTURE_HOURS = (7, 21)  # local departure hours considered convenient, [start, end)
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import IS_PRODUCTION, ENRICHMENT_MAX_WORKERS, ENRICHMENT_TIMEOUTS
+from map_utils import extract_travel_info_llm, get_coordinates
+from google_reviews import get_hotel_reviews_summary
+from api_client import generate_llm_reviews
+
+logger = logging.getLogger(__name__)
+
+# Shared by every session in the process; workers must not call into streamlit
+_executor = ThreadPoolExecutor(max_workers=ENRICHMENT_MAX_WORKERS, thread_name_prefix="enrichment")
+
+def fetch_reviews(location, api_client):
+    if IS_PRODUCTION:
+        return generate_llm_reviews(location, location)
+    return get_hotel_reviews_summary(location, api_client, location=location)
+
+def _wait(future, timeout, stage, default):
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logger.warning(f"Enrichment stage '{stage}' did not finish within {timeout}s")
+        return default
+    except Exception as e:
+        logger.error(f"Enrichment stage '{stage}' failed: {str(e)}")
+        return default
+
+class EnrichmentJob:
+    """Post-response enrichment for a single assistant answer.
+
+    Extraction is submitted as soon as the job is created. When it finishes,
+    every location is geocoded and the reviews of the first location (the
+    default selectbox entry) are fetched, all in parallel. Readers wait on the
+    futures with per-stage timeouts and get a fallback value instead of
+    stalling the page.
+    """
+
+    def __init__(self, text, api_client):
+        self.api_client = api_client
+        self._lock = threading.Lock()
+        self._geocode_futures = {}
+        self._review_futures = {}
+        self._extraction = _executor.submit(extract_travel_info_llm, text, api_client)
+        self._extraction.add_done_callback(self._fan_out)
+
+    def _fan_out(self, future):
+        if future.cancelled() or future.exception():
+            return
+        locations, _ = future.result()
+        for location in locations:
+            self._geocode_future(location)
+        if locations:
+            self._review_future(locations[0])
+
+    def _geocode_future(self, location):
+        with self._lock:
+            if location not in self._geocode_futures:
+                self._geocode_futures[location] = _executor.submit(get_coordinates, location)
+            return self._geocode_futures[location]
+
+    def _review_future(self, location):
+        with self._lock:
+            if location not in self._review_futures:
+                self._review_futures[location] = _executor.submit(fetch_reviews, location, self.api_client)
+            return self._review_futures[location]
+
+    def travel_info(self, timeout=None):
+        timeout = ENRICHMENT_TIMEOUTS['extraction'] if timeout is None else timeout
+        return _wait(self._extraction, timeout, 'extraction', ([], []))
+
+    def coordinates(self, locations, timeout=None):
+        """Return coordinates aligned with locations, None where unavailable."""
+        timeout = ENRICHMENT_TIMEOUTS['geocoding'] if timeout is None else timeout
+        futures = [self._geocode_future(location) for location in locations]
+        deadline = time.monotonic() + timeout
+        return [_wait(future, max(0, deadline - time.monotonic()), 'geocoding', None) for future in futures]
+
+    def reviews(self, location, timeout=None):
+        timeout = ENRICHMENT_TIMEOUTS['reviews'] if timeout is None else timeout
+        return _wait(self._review_future(location), timeout, 'reviews', None)
+
+    def reviews_pending(self, location):
+        with self._lock:
+            future = self._review_futures.get(location)
+        return future is not None and not future.done()
+
+def start_enrichment(text, api_client):
+    return EnrichmentJob(text, api_client)
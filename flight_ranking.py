@@ -0,0 +1,189 @@
+import logging
+import re
+from datetime import datetime
+from config import FLIGHT_TOP_K, FLIGHT_RANKING_WEIGHTS, FLIGHT_PREFERRED_DEPARTURE_HOURS
+
+logger = logging.getLogger(__name__)
+
+# Carrier codes for the airlines users list by name in preferences.travel.preferred_airlines
+CARRIER_NAMES = {
+    'AA': 'American Airlines',
+    'AC': 'Air Canada',
+    'AF': 'Air France',
+    'AI': 'Air India',
+    'AS': 'Alaska Airlines',
+    'AY': 'Finnair',
+    'AZ': 'ITA Airways',
+    'B6': 'JetBlue',
+    'BA': 'British Airways',
+    'CX': 'Cathay Pacific',
+    'DL': 'Delta Air Lines',
+    'EI': 'Aer Lingus',
+    'EK': 'Emirates',
+    'ET': 'Ethiopian Airlines',
+    'EY': 'Etihad Airways',
+    'IB': 'Iberia',
+    'JL': 'Japan Airlines',
+    'KE': 'Korean Air',
+    'KL': 'KLM',
+    'LH': 'Lufthansa',
+    'LX': 'Swiss',
+    'NH': 'ANA',
+    'NZ': 'Air New Zealand',
+    'OS': 'Austrian Airlines',
+    'QF': 'Qantas',
+    'QR': 'Qatar Airways',
+    'SK': 'SAS',
+    'SQ': 'Singapore Airlines',
+    'TK': 'Turkish Airlines',
+    'UA': 'United Airlines',
+    'UK': 'Vistara',
+    'VS': 'Virgin Atlantic',
+    'WN': 'Southwest Airlines',
+    '6E': 'IndiGo',
+}
+
+_ISO_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$')
+
+def carrier_name(code):
+    return CARRIER_NAMES.get(code, code)
+
+def parse_iso_duration(value):
+    """Minutes in an ISO 8601 duration such as PT7H30M or P1DT2H, or None if it cannot be parsed."""
+    match = _ISO_DURATION.match(value or '')
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+def _preferred_codes(user_profile):
+    preferred = (user_profile or {}).get('preferences', {}).get('travel', {}).get('preferred_airlines', [])
+    by_name = {name.lower(): code for code, name in CARRIER_NAMES.items()}
+    codes = set()
+    for airline in preferred:
+        airline = airline.strip()
+        if airline.upper() in CARRIER_NAMES:
+            codes.add(airline.upper())
+        elif airline.lower() in by_name:
+            codes.add(by_name[airline.lower()])
+    return codes
+
+def _departure_penalty(hour, window):
+    """0 inside the window, rising to 1 for a departure 6 or more hours outside it."""
+    start, end = window
+    if start <= hour < end:
+        return 0.0
+    distance = min((start - hour) % 24, (hour - end + 1) % 24)
+    return min(distance / 6.0, 1.0)
+
+def _offer_features(offer, preferred_codes, window):
+    amount, _, currency = offer['price'].partition(' ')
+    durations = offer.get('durations') or []
+    # Pair each itinerary with its duration before dropping empty ones, so the two stay aligned
+    legs = [(itinerary, durations[index] if index < len(durations) else None)
+            for index, itinerary in enumerate(offer['itineraries']) if itinerary]
+    if not legs:
+        raise ValueError("offer has no segments")
+    itineraries = [itinerary for itinerary, _ in legs]
+
+    total_minutes = 0
+    for segments, duration in legs:
+        minutes = parse_iso_duration(duration)
+        if minutes is None:
+            # Local clock times, so this is only an estimate across time zones
+            departure = datetime.fromisoformat(segments[0]['departure']['at'])
+            arrival = datetime.fromisoformat(segments[-1]['arrival']['at'])
+            minutes = max(0, int((arrival - departure).total_seconds() // 60))
+        total_minutes += minutes
+
+    segments = [segment for itinerary in itineraries for segment in itinerary]
+    carriers = sorted({segment['carrierCode'] for segment in segments})
+    preferred_share = sum(segment['carrierCode'] in preferred_codes for segment in segments) / len(segments)
+    departure_hours = [datetime.fromisoformat(itinerary[0]['departure']['at']).hour for itinerary in itineraries]
+    return {
+        "price": float(amount),
+        "currency": currency,
+        "duration_minutes": total_minutes,
+        "stops": sum(len(itinerary) - 1 for itinerary in itineraries),
+        "carriers": carriers,
+        "preferred_airline": preferred_share > 0,
+        "airline_penalty": 1.0 - preferred_share if preferred_codes else 0.0,
+        "departure_penalty": sum(_departure_penalty(hour, window) for hour in departure_hours) / len(departure_hours),
+    }
+
+def _spread(values):
+    low, high = min(values), max(values)
+    return lambda value: (value - low) / (high - low) if high > low else 0.0
+
+def rank_flights(flight_results, user_profile=None, top_k=FLIGHT_TOP_K, weights=FLIGHT_RANKING_WEIGHTS,
+                 departure_window=FLIGHT_PREFERRED_DEPARTURE_HOURS):
+    """Score format_flight_results output and return the top_k offers, best first.
+
+    Price, total duration and stops are scaled against the other offers (0 for
+    the best, 1 for the worst); airline and departure-time penalties are
+    absolute. The score is 1 minus the weighted sum of penalties, so it lies in
+    [0, 1]. Ties are broken by price, duration, then search order, so the
+    ranking is deterministic. Offers that cannot be parsed are skipped.
+    """
+    preferred_codes = _preferred_codes(user_profile)
+    candidates = []
+    for index, offer in enumerate(flight_results or []):
+        try:
+            candidates.append((index, offer, _offer_features(offer, preferred_codes, departure_window)))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping unrankable flight offer {index + 1}: {str(e)}")
+    if not candidates:
+        return []
+
+    price_penalty = _spread([features["price"] for _, _, features in candidates])
+    duration_penalty = _spread([features["duration_minutes"] for _, _, features in candidates])
+    stops_penalty = _spread([features["stops"] for _, _, features in candidates])
+    total_weight = sum(weights.values()) or 1.0
+
+    ranked = []
+    for index, offer, features in candidates:
+        penalties = {
+            'price': price_penalty(features["price"]),
+            'duration': duration_penalty(features["duration_minutes"]),
+            'stops': stops_penalty(features["stops"]),
+            'airline': features["airline_penalty"],
+            'departure_time': features["departure_penalty"],
+        }
+        score = 1.0 - sum(weights.get(name, 0.0) * penalty for name, penalty in penalties.items()) / total_weight
+        ranked.append({
+            "score": round(score, 4),
+            "penalties": {name: round(penalty, 4) for name, penalty in penalties.items()},
+            "price": features["price"],
+            "currency": features["currency"],
+            "duration_minutes": features["duration_minutes"],
+            "stops": features["stops"],
+            "carriers": features["carriers"],
+            "preferred_airline": features["preferred_airline"],
+            "offer": offer,
+            "_order": index,
+        })
+
+    ranked.sort(key=lambda flight: (-flight["score"], flight["price"], flight["duration_minutes"], flight["_order"]))
+    top = ranked[:top_k]
+    for rank, flight in enumerate(top, 1):
+        flight["rank"] = rank
+        del flight["_order"]
+    return top
+
+def format_duration(minutes):
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+def describe_flight(flight):
+    """One-line summary of a ranked flight for the LLM prompt."""
+    carriers = ", ".join(f"{carrier_name(code)} ({code})" for code in flight["carriers"])
+    legs = []
+    for itinerary in flight["offer"]["itineraries"]:
+        if not itinerary:
+            continue
+        route = " -> ".join([itinerary[0]['departure']['iataCode']] + [segment['arrival']['iataCode'] for segment in itinerary])
+        legs.append(f"{route} departing {itinerary[0]['departure']['at']} arriving {itinerary[-1]['arrival']['at']}")
+    return (
+        f"Option {flight['rank']} (score {flight['score']:.2f}): {flight['price']:.2f} {flight['currency']}, "
+        f"{format_duration(flight['duration_minutes'])} total travel time, {flight['stops']} stop(s), {carriers}"
+        f"{' [preferred airline]' if flight['preferred_airline'] else ''}; " + "; ".join(legs)
+    )
@@ -1,7 +1,9 @@
 import streamlit as st
 from amadeus_api import AmadeusAPI, format_flight_results
 from config import AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET, USE_MOCK_DATA
-from api_client import invoke_model
+from api_client import invoke_model_stream
+from flight_ranking import rank_flights, describe_flight, carrier_name, format_duration
+from chat_context import get_chat_context
 import logging
 from datetime import datetime
 import json
@@ -10,59 +12,17 @@ import json
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Flight recommendation prompt
+# Flight recommendation prompt; the offers are ranked locally and only the best few are included
 FLIGHT_RECOMMENDATION_PROMPT = """
-You are an AI travel assistant specializing in flight recommendations. You have been provided with flight search results and the user's profile information. Your task is to analyze this data and provide personalized flight recommendations.
-
-User Profile:
-{user_profile_json}
+You are an AI travel assistant specializing in flight recommendations. The user's flight search returned {total_offers} offers. They have been scored on price, total travel time, stops, the user's preferred airlines and departure time, and the best {top_k} are listed below, best first.
 
 Recent Conversation Context:
 {conversation_context}
 
-Flight Search Results:
-{flight_results_json}
-
-Based on the above information, please provide:
-1. A personalized recommendation for the best flight option(s) considering the user's preferences, past trips, and any relevant information from the recent conversation. If no clear preferences are found, provide a general recommendation based on factors like price, duration, and convenience.
-2. A formatted version of the flight details with airport and airline codes expanded to their full names.
-
-Your response MUST be a valid JSON object with two main elements:
-1. "recommendation": A text string containing your personalized flight recommendation and explanation.
-2. "formatted_results": An array of formatted flight options, each containing expanded details (full airport and airline names) and all relevant information from the original search results.
-
-Use the following format for your response:
-
-{{
-  "recommendation": "Your personalized recommendation text here...",
-  "formatted_results": [
-    {{
-      "price": "Price in original currency",
-      "itineraries": [
-        {{
-          "segments": [
-            {{
-              "departure": {{
-                "airport": "Full name of departure airport",
-                "iataCode": "Original IATA code",
-                "date": "Departure date and time"
-              }},
-              "arrival": {{
-                "airport": "Full name of arrival airport",
-                "iataCode": "Original IATA code",
-                "date": "Arrival date and time"
-              }},
-              "airline": "Full name of airline",
-              "airlineCode": "Original airline code"
-            }}
-          ]
-        }}
-      ]
-    }}
-  ]
-}}
-
-Ensure that your recommendation is clear, concise, and tailored to the user's needs as much as possible. If there are multiple good options, you may mention them in your recommendation. Remember, your entire response must be a valid JSON object.
+Top Flight Options:
+{top_flights}
+
+Write a short, personalized recommendation: say which option you suggest and why, taking the user's profile and the recent conversation into account, and mention the main trade-offs against the other listed options. Expand airline and airport codes to their full names. Only discuss the options listed above.
 """
 
 # Load mock data function
@@ -71,67 +31,49 @@ def load_mock_data():
         return json.load(f)
     
 def get_flight_recommendations(flight_results, api_client, user_profile, conversation_context):
-    # Prepare the prompt with actual data
+    """Rank the offers locally and return (top_flights, narrative_stream).
+
+    narrative_stream is a generator of text chunks for st.write_stream, or
+    None when there is nothing to recommend.
+    """
+    top_flights = rank_flights(flight_results, user_profile)
+    if not top_flights:
+        return [], None
+
     prompt = FLIGHT_RECOMMENDATION_PROMPT.format(
-        user_profile_json=json.dumps(user_profile),
-        conversation_context=json.dumps(conversation_context),
-        flight_results_json=json.dumps(flight_results)
+        total_offers=len(flight_results),
+        top_k=len(top_flights),
+        conversation_context=conversation_context,
+        top_flights="\n".join(describe_flight(flight) for flight in top_flights)
     )
-    
-    # Get recommendations from the language model
-    response = invoke_model(prompt, api_client, user_profile)
-    
-    try:
-        # Attempt to parse the entire response as JSON
-        recommendations = json.loads(response)
-        return recommendations
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse entire LLM response as JSON: {e}")
-        # If parsing the entire response fails, try to extract JSON from the response
-        try:
-            # Find the start and end of the JSON object
-            start = response.find('{')
-            end = response.rfind('}') + 1
-            if start != -1 and end != -1:
-                json_str = response[start:end]
-                recommendations = json.loads(json_str)
-                return recommendations
-            else:
-                raise ValueError("No valid JSON object found in the response")
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Failed to extract valid JSON from LLM response: {e}")
-            st.error("An error occurred while processing flight recommendations.")
-            return None
-
-def display_flight_recommendations(recommendations):
-    if not recommendations:
-        st.warning("Unable to generate flight recommendations at this time.")
-        return
-
-    st.subheader("Flight Recommendations")
-    st.write(recommendations["recommendation"])
+    return top_flights, invoke_model_stream(prompt, api_client, user_profile)
 
+def display_flight_options(top_flights):
     st.subheader("Flight Options")
-    for i, flight in enumerate(recommendations["formatted_results"], 1):
-        with st.expander(f"Option {i} - {flight['price']}", expanded=i==1):
-            for j, itinerary in enumerate(flight['itineraries'], 1):
+    for flight in top_flights:
+        carriers = ", ".join(carrier_name(code) for code in flight["carriers"])
+        title = (f"Option {flight['rank']} - {flight['price']:.2f} {flight['currency']} · "
+                 f"{format_duration(flight['duration_minutes'])} · {flight['stops']} stop(s) · {carriers}")
+        with st.expander(title, expanded=flight["rank"] == 1):
+            for j, itinerary in enumerate(flight["offer"]["itineraries"], 1):
                 st.markdown(f"**Itinerary {j}**")
-                
-                for segment in itinerary['segments']:
+
+                for segment in itinerary:
                     col1, col2, col3 = st.columns(3)
-                    
+
                     with col1:
-                        st.markdown(f"**From: {segment['departure']['airport']}**")
-                        st.write(f"({segment['departure']['iataCode']}) {segment['departure']['date']}")
-                    
+                        st.markdown(f"**From: {segment['departure']['iataCode']}**")
+                        st.write(segment['departure']['at'])
+
                     with col2:
-                        st.markdown(f"**To: {segment['arrival']['airport']}**")
-                        st.write(f"({segment['arrival']['iataCode']}) {segment['arrival']['date']}")
-                    
+                        st.markdown(f"**To: {segment['arrival']['iataCode']}**")
+                        st.write(segment['arrival']['at'])
+
                     with col3:
-                        st.write(f"Airline: {segment['airline']} ({segment['airlineCode']})")
-                    
+                        st.write(f"Airline: {carrier_name(segment['carrierCode'])} ({segment['carrierCode']})")
+
                     st.markdown("---")
+            st.caption(f"Score {flight['score']:.2f}" + (" · preferred airline" if flight["preferred_airline"] else ""))
 
 def flight_search_page():
     st.title("Flight Search")
@@ -180,19 +122,32 @@ def flight_search_page():
                         )
                         results = format_flight_results(flights)
                     
-                    # Get recommendations
-                    recommendations = get_flight_recommendations(
-                        results, 
-                        st.session_state.api_client, 
+                    # Rank locally; only the top options go to the LLM
+                    top_flights, narrative = get_flight_recommendations(
+                        results,
+                        st.session_state.api_client,
                         st.session_state.user_profile,
-                        st.session_state.get('chat_history', [])[-5:]  # Get last 5 messages as context
+                        get_chat_context()
                     )
-                    
-                    # Display recommendations
-                    display_flight_recommendations(recommendations)
                 except Exception as e:
                     st.error(f"An error occurred while searching for flights: {str(e)}")
                     logger.error(f"Flight search error: {str(e)}")
+                    return
+
+            if not top_flights:
+                st.warning("No flights found for this search.")
+                return
+
+            # The ranked options are ready immediately; the write-up streams in above them
+            st.subheader("Flight Recommendations")
+            recommendation = st.container()
+            display_flight_options(top_flights)
+            with recommendation:
+                try:
+                    st.write_stream(narrative)
+                except Exception as e:
+                    st.warning("Unable to generate a flight recommendation at this time.")
+                    logger.error(f"Flight recommendation error: {str(e)}")
         else:
             st.warning("Please fill in all required fields.")
 
@@ -0,0 +1,114 @@
+import functools
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from config import GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+def normalize_location(location):
+    location = re.sub(r'\s+', ' ', location.strip().lower())
+    return location.strip(' .,;:')
+
+class GeocodeCache:
+    """On-disk geocoding cache keyed by backend and normalised location.
+
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted once max_entries is exceeded. Only successful lookups are stored,
+    so transient backend errors are retried on the next call.
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode (
+                    backend TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lng REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (backend, query)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS geocode_last_access ON geocode (last_access)")
+
+    def get(self, backend, location):
+        key = normalize_location(location)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lng, created_at FROM geocode WHERE backend = ? AND query = ?",
+                (backend, key)
+            ).fetchone()
+            if row and now - row[2] < self.ttl:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE geocode SET last_access = ? WHERE backend = ? AND query = ?",
+                        (now, backend, key)
+                    )
+                self.hits += 1
+                return row[0], row[1]
+            self.misses += 1
+            return None
+
+    def set(self, backend, location, coordinates):
+        key = normalize_location(location)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (backend, query, lat, lng, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (backend, key, coordinates[0], coordinates[1], now, now)
+            )
+            self._conn.execute("DELETE FROM geocode WHERE created_at < ?", (now - self.ttl,))
+            count = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM geocode WHERE rowid IN (SELECT rowid FROM geocode ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_ENTRIES)
+
+def cached_geocoder(backend):
+    """Decorate a get_coordinates_* function with the shared geocode cache."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(location):
+            try:
+                coordinates = geocode_cache.get(backend, location)
+            except sqlite3.Error as e:
+                logger.error(f"Geocode cache read failed: {str(e)}")
+                coordinates = None
+            if coordinates:
+                return coordinates
+            coordinates = func(location)
+            if coordinates:
+                try:
+                    geocode_cache.set(backend, location, coordinates)
+                except sqlite3.Error as e:
+                    logger.error(f"Geocode cache write failed: {str(e)}")
+            return coordinates
+        return wrapper
+    return decorator
@@ -1,27 +1,66 @@
 import googlemaps
 from googlemaps import exceptions
 import logging
-from config import GOOGLE_MAPS_API_KEY, API_MODE, CLAUDE_MODEL_ID, AWS_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_CLAUDE_MODEL_ID, AWS_SESSION_TOKEN
+from config import GOOGLE_MAPS_API_KEY, API_MODE, CLAUDE_MODEL_ID, AWS_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_CLAUDE_MODEL_ID, AWS_SESSION_TOKEN, LLM_MAX_TOKENS
+from config import PLACE_ID_CACHE_TTL, PLACE_DETAILS_CACHE_TTL, REVIEW_SUMMARY_CACHE_TTL, REVIEWS_CACHE_MAX_ENTRIES
+from config import PHOTO_CACHE_DIR, PHOTO_DISK_CACHE_MAX_BYTES, PHOTO_MEMORY_CACHE_ENTRIES, PHOTO_PREFETCH_WORKERS
 import json
-import base64
-import boto3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache_utils import TTLCache, DiskCache
+from llm_provider import get_provider
 import os
 
 logger = logging.getLogger(__name__)
 
 
+_gmaps_client = None
+_gmaps_lock = threading.Lock()
+
+# Shared across sessions; only successful lookups are cached
+_place_id_cache = TTLCache(REVIEWS_CACHE_MAX_ENTRIES, ttl=PLACE_ID_CACHE_TTL)
+_place_details_cache = TTLCache(REVIEWS_CACHE_MAX_ENTRIES, ttl=PLACE_DETAILS_CACHE_TTL)
+_review_summary_cache = TTLCache(REVIEWS_CACHE_MAX_ENTRIES, ttl=REVIEW_SUMMARY_CACHE_TTL)
+
+# Photo bytes keyed by (photo_reference, max_width); fetches for the same key share one future
+_photo_memory_cache = TTLCache(PHOTO_MEMORY_CACHE_ENTRIES)
+_photo_disk_cache = DiskCache(PHOTO_CACHE_DIR, PHOTO_DISK_CACHE_MAX_BYTES)
+_photo_executor = ThreadPoolExecutor(max_workers=PHOTO_PREFETCH_WORKERS, thread_name_prefix="photo-prefetch")
+_photo_inflight = {}
+_photo_inflight_lock = threading.Lock()
+
+def get_gmaps_client():
+    global _gmaps_client
+    with _gmaps_lock:
+        if _gmaps_client is None:
+            _gmaps_client = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+        return _gmaps_client
+
+def reviews_cache_stats():
+    return {
+        "place_id": _place_id_cache.stats(),
+        "place_details": _place_details_cache.stats(),
+        "review_summary": _review_summary_cache.stats(),
+        "photo_memory": _photo_memory_cache.stats(),
+        "photo_disk": _photo_disk_cache.stats()
+    }
+
 class GoogleReviews:
     def __init__(self):
-        self.gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
-        if API_MODE == 'bedrock':
-            session = boto3.session.Session()
-            self.bedrock_client = session.client('bedrock-runtime')
+        self.gmaps = get_gmaps_client()
 
     def get_place_id(self, place_name, location=None):
+        cache_key = (place_name, location)
+        place_id = _place_id_cache.get(cache_key)
+        if place_id:
+            return place_id
         try:
             places_result = self.gmaps.places(query=place_name, location=location)
             if places_result['results']:
-                return places_result['results'][0]['place_id']
+                place_id = places_result['results'][0]['place_id']
+                _place_id_cache.set(cache_key, place_id)
+                return place_id
             else:
                 logger.warning(f"No place found for: {place_name}")
                 return None
@@ -35,9 +74,13 @@ class GoogleReviews:
             return None
 
         try:
-            place_details = self.gmaps.place(place_id=place_id, fields=['name', 'rating', 'review', 'photo'])
-            if 'result' in place_details:
-                result = place_details['result']
+            result = _place_details_cache.get(place_id)
+            if result is None:
+                place_details = self.gmaps.place(place_id=place_id, fields=['name', 'rating', 'review', 'photo'])
+                result = place_details.get('result')
+                if result is not None:
+                    _place_details_cache.set(place_id, result)
+            if result is not None:
                 reviews = result.get('reviews', [])
                 photos = result.get('photos', [])
                 return {
@@ -60,13 +103,12 @@ class GoogleReviews:
             logger.error(f"Error fetching reviews: {str(e)}")
             return None
 
-    def get_photo(self, photo_reference, max_width=400):
+    def get_photo_bytes(self, photo_reference, max_width=400):
         try:
             photo = self.gmaps.places_photo(photo_reference, max_width=max_width)
             if photo:
                 # Read the entire content of the photo
-                photo_data = b''.join(photo)
-                return base64.b64encode(photo_data).decode('utf-8')
+                return b''.join(photo)
             else:
                 logger.warning(f"No photo found for reference: {photo_reference}")
                 return None
@@ -87,6 +129,11 @@ class GoogleReviews:
         review_texts = [review['text'] for review in reviews]
         combined_reviews = "\n".join(review_texts)
 
+        cache_key = hashlib.sha256(combined_reviews.encode('utf-8')).hexdigest()
+        summary = _review_summary_cache.get(cache_key)
+        if summary is not None:
+            return summary
+
         prompt = f"""
         Analyze the following hotel reviews and provide:
         1. A concise summary of the overall sentiment
@@ -109,40 +156,7 @@ class GoogleReviews:
         """
 
         try:
-            if API_MODE == 'bedrock':
-                body = json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 500,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                })
-                response = self.bedrock_client.invoke_model(
-                    body=body,
-                    modelId=AWS_CLAUDE_MODEL_ID,
-                    accept='application/json',
-                    contentType='application/json'
-                )
-                response_body = json.loads(response.get('body').read())
-                summary_json = response_body['content'][0]['text']
-            elif API_MODE == 'huggingface':
-                response = api_client.chat(prompt)
-                summary_json = str(response)
-            elif API_MODE == 'native_claude':
-                response = api_client.messages.create(
-                    model="claude-3-5-sonnet-20240620",
-                    max_tokens=500,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                )
-                summary_json = response.content[0].text
+            summary_json = get_provider(api_client).complete(prompt, LLM_MAX_TOKENS['review_summary'])
 
             summary_json = summary_json.strip()
             if summary_json.startswith("```json"):
@@ -153,6 +167,7 @@ class GoogleReviews:
 
             try:
                 summary = json.loads(summary_json)
+                _review_summary_cache.set(cache_key, summary)
                 return summary
             except json.JSONDecodeError as e:
                 logger.error(f"Error parsing JSON response: {str(e)}")
@@ -178,9 +193,50 @@ def get_hotel_reviews(hotel_name, location=None, max_reviews=5):
     return reviewer.get_reviews(hotel_name, location, max_reviews)
 
 
-def get_place_photo(photo_reference, max_width=800):
-    reviewer = GoogleReviews()
-    return reviewer.get_photo(photo_reference, max_width)
+def _load_photo(photo_reference, max_width):
+    key = (photo_reference, max_width)
+    try:
+        data = _photo_memory_cache.get(key)
+        if data is not None:
+            return data
+        data = _photo_disk_cache.get(key)
+        if data is None:
+            data = GoogleReviews().get_photo_bytes(photo_reference, max_width)
+            if data is None:
+                return None
+            _photo_disk_cache.set(key, data)
+        _photo_memory_cache.set(key, data)
+        return data
+    finally:
+        with _photo_inflight_lock:
+            _photo_inflight.pop(key, None)
+
+
+def _photo_future(photo_reference, max_width):
+    key = (photo_reference, max_width)
+    with _photo_inflight_lock:
+        future = _photo_inflight.get(key)
+        if future is None:
+            future = _photo_executor.submit(_load_photo, photo_reference, max_width)
+            _photo_inflight[key] = future
+        return future
+
+
+def get_place_photo_bytes(photo_reference, max_width=800):
+    data = _photo_memory_cache.get((photo_reference, max_width))
+    if data is not None:
+        return data
+    try:
+        return _photo_future(photo_reference, max_width).result()
+    except Exception as e:
+        logger.error(f"Error loading photo: {str(e)}")
+        return None
+
+
+def prefetch_place_photos(photo_references, max_width=800):
+    """Warm the photo caches in the background without waiting for the results."""
+    for photo_reference in photo_references:
+        _photo_future(photo_reference, max_width)
 
 
 def get_hotel_reviews_summary(hotel_name, api_client, location=None, max_reviews=5):
@@ -0,0 +1,115 @@
+import io
+import logging
+import os
+import struct
+import threading
+from PIL import Image, ImageOps, features
+from cache_utils import DiskCache, TTLCache
+from config import IMAGE_VARIANT_SIZES, IMAGE_VARIANT_FORMAT, IMAGE_VARIANT_QUALITY
+from config import IMAGE_VARIANT_CACHE_DIR, IMAGE_VARIANT_CACHE_MAX_BYTES, PHOTO_MEMORY_CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Each cached variant is stored as an 8-byte original size header followed by the encoded image
+_HEADER = struct.Struct('>Q')
+
+_variant_disk_cache = DiskCache(IMAGE_VARIANT_CACHE_DIR, IMAGE_VARIANT_CACHE_MAX_BYTES)
+_variant_memory_cache = TTLCache(PHOTO_MEMORY_CACHE_ENTRIES)
+
+_stats_lock = threading.Lock()
+_stats = {"served": 0, "generated": 0, "original_bytes": 0, "served_bytes": 0}
+
+def _output_format():
+    if IMAGE_VARIANT_FORMAT.upper() == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'JPEG'
+
+OUTPUT_FORMAT = _output_format()
+
+def _encode_variant(data, variant):
+    max_size = IMAGE_VARIANT_SIZES[variant]
+    with Image.open(io.BytesIO(data)) as img:
+        # Let the JPEG decoder downscale while reading instead of decoding every pixel
+        img.draft('RGB', max_size)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(max_size, Image.LANCZOS)
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+        if OUTPUT_FORMAT == 'WEBP':
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if has_alpha else 'RGB')
+            options = {'quality': IMAGE_VARIANT_QUALITY, 'method': 4}
+        else:
+            if has_alpha:
+                # JPEG has no alpha channel, so flatten onto white
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel('A'))
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            options = {'quality': IMAGE_VARIANT_QUALITY, 'optimize': True, 'progressive': True}
+        output = io.BytesIO()
+        img.save(output, format=OUTPUT_FORMAT, **options)
+        return output.getvalue()
+
+def _record(original_size, variant_size, generated):
+    with _stats_lock:
+        _stats["served"] += 1
+        _stats["generated"] += int(generated)
+        _stats["original_bytes"] += original_size
+        _stats["served_bytes"] += variant_size
+
+def get_variant(source_key, load_source, variant='carousel'):
+    """Return the encoded bytes of a resized variant of an image.
+
+    source_key must change whenever the source image does; load_source is only
+    called on a cache miss and returns the original image bytes. If the image
+    cannot be decoded the original bytes are returned unchanged.
+    """
+    key = (source_key, variant, IMAGE_VARIANT_SIZES[variant], OUTPUT_FORMAT, IMAGE_VARIANT_QUALITY)
+    blob = _variant_memory_cache.get(key)
+    if blob is None:
+        blob = _variant_disk_cache.get(key)
+        if blob is not None:
+            _variant_memory_cache.set(key, blob)
+    if blob is not None:
+        original_size, = _HEADER.unpack_from(blob)
+        _record(original_size, len(blob) - _HEADER.size, generated=False)
+        return blob[_HEADER.size:]
+
+    data = load_source()
+    if data is None:
+        return None
+    try:
+        encoded = _encode_variant(data, variant)
+    except Exception as e:
+        logger.error(f"Error resizing image {source_key!r}: {str(e)}")
+        return data
+    # Never serve a variant that is larger than what it replaces
+    if len(encoded) >= len(data):
+        encoded = data
+    blob = _HEADER.pack(len(data)) + encoded
+    _variant_disk_cache.set(key, blob)
+    _variant_memory_cache.set(key, blob)
+    _record(len(data), len(encoded), generated=True)
+    return encoded
+
+def variant_for_file(path, variant='carousel'):
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logger.error(f"Error reading image {path}: {str(e)}")
+        return None
+
+    def load_source():
+        with open(path, 'rb') as f:
+            return f.read()
+
+    return get_variant(('file', os.path.abspath(path), stat.st_mtime_ns, stat.st_size), load_source, variant)
+
+def image_pipeline_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["bytes_saved"] = stats["original_bytes"] - stats["served_bytes"]
+    stats["format"] = OUTPUT_FORMAT
+    stats["disk_cache"] = _variant_disk_cache.stats()
+    return stats
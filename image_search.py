@@ -6,11 +6,13 @@ import base64
 import json
 import logging
 from io import BytesIO
-import boto3
-from config import AWS_ACCESS_KEY_ID, AWS_REGION, AWS_SECRET_ACCESS_KEY,AWS_SESSION_TOKEN
+from aws_clients import get_client
+from llm_provider import get_provider
+from config import LLM_MAX_TOKENS
 from jsonschema import validate
 from streamlit_extras.switch_page_button import switch_page
-from api_client import invoke_model, initialize_api_client
+from api_client import invoke_model_stream, initialize_api_client
+from chat_context import get_chat_context
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -181,40 +183,25 @@ def analyze_image(client, image_base64):
     Ensure your response is a valid JSON object matching the structure provided above.
     """
 
-    body = json.dumps({
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 1000,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": image_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
+    content = [
+        {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/jpeg",
+                "data": image_base64
             }
-        ]
-    })
+        },
+        {
+            "type": "text",
+            "text": prompt
+        }
+    ]
 
     try:
-        response = client.invoke_model(
-            body=body,
-            modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-            contentType="application/json",
-            accept="application/json"
-        )
-
-        response_body = json.loads(response.get('body').read())
-        analysis_result = json.loads(response_body['content'][0]['text'])
+        # Image input needs a Claude backend, so this always runs on Bedrock
+        provider = get_provider(client, backend='bedrock')
+        analysis_result = json.loads(provider.complete(content, LLM_MAX_TOKENS['image_analysis']))
 
         logger.info("Response received successfully")
         return analysis_result
@@ -254,13 +241,7 @@ def image_search_page():
             if analyze_button:
                 with st.spinner('Analyzing image...'):
                     base64_image = encode_image(uploaded_file)
-                    session = boto3.Session(
-                        aws_access_key_id=AWS_ACCESS_KEY_ID,
-                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                        aws_session_token=AWS_SESSION_TOKEN,
-                        region_name=AWS_REGION
-                    )
-                    bedrock = session.client('bedrock-runtime')
+                    bedrock = get_client('bedrock-runtime')
                     st.session_state.analysis_result = analyze_image(bedrock, base64_image)
 
             if st.session_state.analysis_result:
@@ -269,22 +250,18 @@ def image_search_page():
                 st.success("Ready to plan your trip? Click the button below and see the magic!")
 
                 if st.button(f"Plan a trip to {st.session_state.analysis_result['identified_location']}"):
-                    with st.spinner("Generating travel plan..."):
-                        chat_message = f"I'd like to plan a trip to {st.session_state.analysis_result['identified_location']}. Can you provide information on accommodations, transportation, attractions, and the best time to visit?"
-                        
-                        # Create context from recent chat history
-                        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in st.session_state.chat_history[-5:]])
-                        
-                        # Generate AI response with context
-                        ai_response = invoke_model(chat_message, st.session_state.api_client, st.session_state.user_profile, context)
-                        
-                        # Add the chat message and AI response to chat history
-                        st.session_state.chat_history.append({"role": "user", "content": chat_message})
-                        st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
-                        
-                        # Display the AI response
-                        st.markdown("### Trip Plan")
-                        st.write(ai_response)
+                    chat_message = f"I'd like to plan a trip to {st.session_state.analysis_result['identified_location']}. Can you provide information on accommodations, transportation, attractions, and the best time to visit?"
+                    
+                    # Create context from recent chat history
+                    context = get_chat_context()
+                    
+                    # Stream the AI response with context
+                    st.markdown("### Trip Plan")
+                    ai_response = st.write_stream(invoke_model_stream(chat_message, st.session_state.api_client, st.session_state.user_profile, context))
+                    
+                    # Add the chat message and AI response to chat history
+                    st.session_state.chat_history.append({"role": "user", "content": chat_message})
+                    st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
 
     # # Display chat interface (without the header)
     # for message in st.session_state.chat_history:
@@ -295,6 +272,11 @@ def image_search_page():
     user_input = st.chat_input("Ask about the image or location...")
 
     if user_input:
+        # Display chat interface (without the header) up to the new turn
+        for message in st.session_state.chat_history:
+            with st.chat_message(message["role"]):
+                st.write(message["content"])
+
         # Display user message
         st.chat_message("user").write(user_input)
         
@@ -302,21 +284,14 @@ def image_search_page():
         st.session_state.chat_history.append({"role": "user", "content": user_input})
 
         # Create context from recent chat history
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in st.session_state.chat_history[-5:]])
-
-        # Generate AI response
-        with st.spinner("Thinking..."):
-            response = invoke_model(user_input, st.session_state.api_client, st.session_state.user_profile, context)
-            
-            # Display AI response
-            #st.chat_message("assistant").write(response)
-            
-            # Add AI response to chat history
-            st.session_state.chat_history.append({"role": "assistant", "content": response})
-            # # Display chat interface (without the header)
-            for message in st.session_state.chat_history:
-                with st.chat_message(message["role"]):
-                    st.write(message["content"])
+        context = get_chat_context()
+
+        # Stream AI response
+        with st.chat_message("assistant"):
+            response = st.write_stream(invoke_model_stream(user_input, st.session_state.api_client, st.session_state.user_profile, context))
+        
+        # Add AI response to chat history
+        st.session_state.chat_history.append({"role": "assistant", "content": response})
 
 if __name__ == "__main__":
     image_search_page()
\ No newline at end of file
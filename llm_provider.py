@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from config import API_MODE, AWS_CLAUDE_MODEL_ID, CLAUDE_MODEL_ID, ANTHROPIC_PROMPT_CACHING, BEDROCK_PROMPT_CACHING
+from aws_clients import get_client
+from resilience import call_llm, stream_llm
+
+logger = logging.getLogger(__name__)
+
+# Needed by anthropic SDK versions that predate prompt caching support
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def _record(backend, started, ok):
+    with _metrics_lock:
+        metrics = _metrics.setdefault(backend, {"calls": 0, "errors": 0, "total_latency": 0.0})
+        metrics["calls"] += 1
+        metrics["total_latency"] += time.monotonic() - started
+        if not ok:
+            metrics["errors"] += 1
+
+def provider_metrics():
+    with _metrics_lock:
+        return {
+            backend: dict(metrics, avg_latency=metrics["total_latency"] / metrics["calls"] if metrics["calls"] else 0.0)
+            for backend, metrics in _metrics.items()
+        }
+
+def _as_text(prompt):
+    if isinstance(prompt, str):
+        return prompt
+    return "".join(block.get("text", "") for block in prompt)
+
+class LLMProvider:
+    """Single dispatch point for completions against one backend.
+
+    prompt is either a string or a list of Claude content blocks; backends
+    without content block support receive the concatenated text. Every call
+    goes through resilience.call_llm and is recorded in provider_metrics.
+    """
+
+    backend = None
+    model_id = None
+    prompt_caching = False
+    # Prepended to chat replies; hugchat answers lack the assistant label
+    reply_prefix = ""
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, prompt, max_tokens):
+        started = time.monotonic()
+        try:
+            text = self._complete(prompt, max_tokens)
+        except Exception:
+            _record(self.backend, started, False)
+            raise
+        _record(self.backend, started, True)
+        return text
+
+    def stream(self, prompt, max_tokens):
+        started = time.monotonic()
+        try:
+            yield from self._stream(prompt, max_tokens)
+        except Exception:
+            _record(self.backend, started, False)
+            raise
+        _record(self.backend, started, True)
+
+    async def acomplete(self, prompt, max_tokens):
+        return await asyncio.to_thread(self.complete, prompt, max_tokens)
+
+    def _complete(self, prompt, max_tokens):
+        raise NotImplementedError
+
+    def _stream(self, prompt, max_tokens):
+        raise NotImplementedError
+
+class BedrockProvider(LLMProvider):
+    backend = 'bedrock'
+    model_id = AWS_CLAUDE_MODEL_ID
+    prompt_caching = BEDROCK_PROMPT_CACHING
+
+    def _body(self, prompt, max_tokens):
+        return json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        })
+
+    def _complete(self, prompt, max_tokens):
+        response = call_llm(self.backend, self.client.invoke_model,
+            body=self._body(prompt, max_tokens),
+            modelId=self.model_id,
+            accept='application/json',
+            contentType='application/json'
+        )
+        response_body = json.loads(response.get('body').read())
+        return response_body['content'][0]['text']
+
+    def _stream(self, prompt, max_tokens):
+        events = stream_llm(self.backend, lambda: self.client.invoke_model_with_response_stream(
+            body=self._body(prompt, max_tokens),
+            modelId=self.model_id,
+            accept='application/json',
+            contentType='application/json'
+        ).get('body'))
+        for event in events:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            payload = json.loads(chunk.get('bytes'))
+            if payload.get('type') == 'content_block_delta':
+                text = payload['delta'].get('text')
+                if text:
+                    yield text
+
+class AnthropicProvider(LLMProvider):
+    backend = 'native_claude'
+    model_id = CLAUDE_MODEL_ID
+    prompt_caching = ANTHROPIC_PROMPT_CACHING
+
+    def _request(self, prompt, max_tokens, **kwargs):
+        return self.client.messages.create(
+            model=self.model_id,
+            max_tokens=max_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            extra_headers=PROMPT_CACHING_HEADERS if self.prompt_caching else None,
+            **kwargs
+        )
+
+    def _complete(self, prompt, max_tokens):
+        return call_llm(self.backend, self._request, prompt, max_tokens).content[0].text
+
+    def _stream(self, prompt, max_tokens):
+        events = stream_llm(self.backend, lambda: self._request(prompt, max_tokens, stream=True))
+        for event in events:
+            if event.type == 'content_block_delta':
+                text = getattr(event.delta, 'text', None)
+                if text:
+                    yield text
+
+class HuggingFaceProvider(LLMProvider):
+    backend = 'huggingface'
+    model_id = 'huggingface'
+    reply_prefix = "TravelEase: "
+
+    def _complete(self, prompt, max_tokens):
+        # hugchat has no max_tokens control
+        return str(call_llm(self.backend, self.client.chat, _as_text(prompt)))
+
+    def _stream(self, prompt, max_tokens):
+        for resp in stream_llm(self.backend, lambda: self.client.query(_as_text(prompt), stream=True)):
+            token = resp.get('token') if isinstance(resp, dict) else resp
+            if token:
+                yield token
+
+PROVIDERS = {
+    'bedrock': BedrockProvider,
+    'native_claude': AnthropicProvider,
+    'huggingface': HuggingFaceProvider,
+}
+
+def get_provider(api_client=None, backend=None):
+    """Return the provider for backend (API_MODE by default) wrapping api_client.
+
+    Bedrock falls back to the shared bedrock-runtime client, so callers that
+    are not handed an api_client can still use it.
+    """
+    backend = backend or API_MODE
+    if backend not in PROVIDERS:
+        raise ValueError(f"Invalid API_MODE: {backend}")
+    if backend == 'bedrock' and api_client is None:
+        api_client = get_client('bedrock-runtime')
+    return PROVIDERS[backend](api_client)
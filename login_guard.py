@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from config import (LOGIN_VERIFY_WORKERS, LOGIN_MAX_QUEUE, LOGIN_VERIFY_TIMEOUT, LOGIN_RATE_WINDOW,
+                    LOGIN_MAX_FAILURES_PER_USER, LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_METRICS_LOG_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+class LoginRateLimitError(Exception):
+    """Raised when a username or client IP has used up its login attempts for the current window."""
+
+class LoginBusyError(Exception):
+    """Raised when LOGIN_MAX_QUEUE verifications are already waiting or running."""
+
+class RateLimiter:
+    """Sliding-window counter of events per key; a key is limited once it has max_events in the last window seconds.
+
+    Keys are kept in order of their newest event, so keys idle for a whole
+    window are evicted from the front on every record and spraying distinct
+    usernames cannot grow the table without bound.
+    """
+
+    def __init__(self, max_events, window):
+        self.max_events = max_events
+        self.window = window
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and now - events[0] >= self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def is_limited(self, key):
+        with self._lock:
+            events = self._prune(key, time.monotonic())
+            return events is not None and len(events) >= self.max_events
+
+    def _evict_idle(self, now):
+        while self._events:
+            key, events = next(iter(self._events.items()))
+            if now - events[-1] < self.window:
+                break
+            del self._events[key]
+
+    def record(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._prune(key, now)
+            self._events.setdefault(key, deque()).append(now)
+            self._events.move_to_end(key)
+            self._evict_idle(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+_user_failures = RateLimiter(LOGIN_MAX_FAILURES_PER_USER, LOGIN_RATE_WINDOW)
+_ip_attempts = RateLimiter(LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_RATE_WINDOW)
+
+# bcrypt releases the GIL while hashing, so a small thread pool caps CPU use without blocking other sessions' scripts
+_verify_executor = ThreadPoolExecutor(max_workers=LOGIN_VERIFY_WORKERS, thread_name_prefix="login-verify")
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "queue_depth": 0,
+    "max_queue_depth": 0,
+    "verified": 0,
+    "wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+    "verify_seconds": 0.0,
+    "rate_limited": 0,
+    "rejected_busy": 0,
+}
+_metrics_logged_at = time.monotonic()
+
+def _count(name):
+    with _metrics_lock:
+        _metrics[name] += 1
+
+def _log_metrics_if_due():
+    global _metrics_logged_at
+    now = time.monotonic()
+    with _metrics_lock:
+        if now - _metrics_logged_at < LOGIN_METRICS_LOG_INTERVAL:
+            return
+        _metrics_logged_at = now
+    logger.info(f"Login metrics: {login_metrics()}")
+
+def _timed_verify(verify, username, password, queued_at):
+    started_at = time.monotonic()
+    try:
+        return verify(username, password)
+    finally:
+        finished_at = time.monotonic()
+        wait = started_at - queued_at
+        with _metrics_lock:
+            _metrics["queue_depth"] -= 1
+            _metrics["verified"] += 1
+            _metrics["wait_seconds"] += wait
+            _metrics["max_wait_seconds"] = max(_metrics["max_wait_seconds"], wait)
+            _metrics["verify_seconds"] += finished_at - started_at
+
+def check_password(verify, username, password, client_ip=None):
+    """Run verify(username, password) on the login pool, applying the per-user and per-IP limits.
+
+    Raises LoginRateLimitError or LoginBusyError instead of verifying when a
+    limit is hit. Failed checks count against the username; every check
+    counts against the client IP, when it is known.
+    """
+    _log_metrics_if_due()
+    if _user_failures.is_limited(username) or (client_ip and _ip_attempts.is_limited(client_ip)):
+        _count("rate_limited")
+        logger.warning(f"Login rate limit hit for user {username!r} from {client_ip or 'unknown IP'}")
+        raise LoginRateLimitError("Too many login attempts. Please wait a few minutes and try again.")
+
+    with _metrics_lock:
+        if _metrics["queue_depth"] >= LOGIN_MAX_QUEUE:
+            _metrics["rejected_busy"] += 1
+            raise LoginBusyError("The server is busy. Please try again in a moment.")
+        _metrics["queue_depth"] += 1
+        _metrics["max_queue_depth"] = max(_metrics["max_queue_depth"], _metrics["queue_depth"])
+
+    if client_ip:
+        _ip_attempts.record(client_ip)
+    future = _verify_executor.submit(_timed_verify, verify, username, password, time.monotonic())
+    ok = future.result(timeout=LOGIN_VERIFY_TIMEOUT)
+    if ok:
+        _user_failures.reset(username)
+    else:
+        _user_failures.record(username)
+    return ok
+
+def login_metrics():
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    verified = metrics["verified"]
+    metrics["avg_wait_seconds"] = metrics["wait_seconds"] / verified if verified else 0.0
+    metrics["avg_verify_seconds"] = metrics["verify_seconds"] / verified if verified else 0.0
+    return metrics
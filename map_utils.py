@@ -4,15 +4,19 @@ from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import logging
 from config import USE_GOOGLE_MAPS, GOOGLE_MAPS_API_KEY, API_MODE, AWS_CLAUDE_MODEL_ID, AWS_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_SESSION_TOKEN, IS_PRODUCTION, AWS_LOCATION_SERVICE_PLACE_INDEX
-import boto3
 import os
 import random
-from config import IS_PRODUCTION, LOCAL_PHOTOS_DIR, GOOGLE_MAPS_API_KEY, AWS_LOCATION_SERVICE_MAP_NAME, AWS_MAP_API_KEY
+from config import IS_PRODUCTION, LOCAL_PHOTOS_DIR, GOOGLE_MAPS_API_KEY, AWS_LOCATION_SERVICE_MAP_NAME, AWS_MAP_API_KEY, GEOCODE_BATCH_WORKERS, LLM_MAX_TOKENS
 import base64
 import anthropic  # New import for native Claude API
 import io
 import math
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from jsonschema import validate, ValidationError
+from geocode_cache import cached_geocoder
+from aws_clients import get_client
+from llm_provider import get_provider
 
 
 logger = logging.getLogger(__name__)
@@ -21,79 +25,6 @@ if not IS_PRODUCTION and USE_GOOGLE_MAPS:
     import googlemaps
     gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
 
-if API_MODE == 'bedrock':
-    session = boto3.Session()
-    bedrock_client = session.client('bedrock-runtime')
-
-def extract_locations_llm(text, api_client):
-    print("extract+locations+llm",text)
-    prompt = f"""
-    Extract the locations associated with establishments from the following list. Each location should be in a format suitable for 
-    geocoding (e.g., "street name, city name, country"). Only extract locations that are specifically associated with establishments 
-    such as hotels, monuments, restaurants, attractions, government offices, emergency services, public facilities, etc. 
-    Do not extract any locations from past trips. Only consider the locations the user is currently in or planning to visit. 
-    Also, do not extract locations that are merely a mention of a country, state, or city without specifying an establishment. 
-    Return the result as a JSON array of strings and mo extra information should be added after JSON array (like strings or sentences). 
-    If no locations are found, return an empty array.
-
-    Text: {text}
-
-    Response (JSON array of strings):
-    """
-
-    try:
-        if API_MODE == 'bedrock':
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-            response = bedrock_client.invoke_model(
-                body=body,
-                modelId=AWS_CLAUDE_MODEL_ID,
-                accept='application/json',
-                contentType='application/json'
-            )
-            response_body = json.loads(response.get('body').read())
-            locations_json = response_body['content'][0]['text']
-        elif API_MODE == 'huggingface':
-            response = api_client.chat(prompt)
-            locations_json = str(response)
-        elif API_MODE == 'native_claude':
-            response = api_client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=200,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
-            locations_json = response.content[0].text
-
-        locations_json = locations_json.strip()
-        print("--locations_json--", locations_json)
-        # if locations_json.startswith("```json"):
-        #     locations_json = locations_json[7:-3]
-        
-        locations = json.loads(locations_json)
-        print("--final_locations_json--", locations)
-        return locations
-    except json.JSONDecodeError as e:
-        logger.error(f"Error parsing JSON response: {str(e)}")
-        logger.error(f"Raw response: {locations_json}")
-        if "<!DOCTYPE html>" in locations_json:
-            logger.error("Received HTML response instead of JSON. API might be down or returning an error page.")
-        return []
-    except Exception as e:
-        logger.error(f"Error extracting locations using LLM: {str(e)}")
-        return []
 
 def get_coordinates_google(location):
     print("get_coordinates_google+location", location)
@@ -113,6 +44,7 @@ def get_coordinates_google(location):
         logger.error(f"Error geocoding location {location} with Google Maps: {str(e)}")
         return None
 
+@cached_geocoder('nominatim')
 def get_coordinates_nominatim(location):
     geolocator = Nominatim(user_agent="voyage_travel_assistant")
     try:
@@ -135,12 +67,24 @@ def get_coordinates(location):
     else:
         return get_coordinates_nominatim(location)
 
+def get_coordinates_batch(locations):
+    """Geocode a list of locations, each distinct one once and concurrently.
+
+    Returns coordinates aligned with locations, None where geocoding failed.
+    """
+    unique_locations = list(dict.fromkeys(locations))
+    if not unique_locations:
+        return []
+    # Nominatim's usage policy allows a single request at a time
+    max_workers = GEOCODE_BATCH_WORKERS if IS_PRODUCTION or USE_GOOGLE_MAPS else 1
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_locations))) as executor:
+        resolved = dict(zip(unique_locations, executor.map(get_coordinates, unique_locations)))
+    return [resolved[location] for location in locations]
+
+@cached_geocoder('aws')
 def get_coordinates_aws(location):
     try:
-        session = boto3.Session()
-        location_client = session.client('location')
-        
-        response = location_client.search_place_index_for_text(
+        response = get_client('location').search_place_index_for_text(
             IndexName=AWS_LOCATION_SERVICE_PLACE_INDEX,
             Text=location
         )
@@ -154,32 +98,18 @@ def get_coordinates_aws(location):
     except Exception as e:
         logger.error(f"Error getting coordinates from AWS Location Service: {str(e)}")
         return None
-def get_random_local_photo():
+def create_aws_location_map_embed(locations, coordinates=None):
     try:
-        photos = [f for f in os.listdir(LOCAL_PHOTOS_DIR) if f.endswith(('.jpg', '.jpeg', '.png'))]
-        if photos:
-            random_photo = random.choice(photos)
-            with open(os.path.join(LOCAL_PHOTOS_DIR, random_photo), 'rb') as f:
-                return base64.b64encode(f.read()).decode('utf-8')
-        else:
-            logger.warning("No local photos found in the photos directory.")
-            return None
-    except Exception as e:
-        logger.error(f"Error fetching local photo: {str(e)}")
-        return None
-
-def create_aws_location_map_embed(locations):
-    try:
-        session = boto3.Session()
-        location_client = session.client('location')
         # Read local MapLibre GL JS files
         current_dir = os.path.dirname(os.path.abspath(__file__))
         with open(os.path.join(current_dir, 'static', 'maplibre-gl.js'), 'r') as js_file:
             maplibre_js = js_file.read()
         with open(os.path.join(current_dir, 'static', 'maplibre-gl.css'), 'r') as css_file:
             maplibre_css = css_file.read()
-        # Get coordinates for all locations
-        coordinates = [get_coordinates_aws(loc) for loc in locations if get_coordinates_aws(loc)]
+        # Get coordinates for all locations, unless they were resolved already
+        if coordinates is None:
+            coordinates = get_coordinates_batch(locations)
+        coordinates = [coord for coord in coordinates if coord]
 
         if not coordinates:
             logger.warning("No valid coordinates found for any locations")
@@ -255,11 +185,10 @@ def create_aws_location_map_embed(locations):
     
 def create_aws_location_map(locations):
     try:
-        session = boto3.Session()
-        location_client = session.client('location')
+        location_client = get_client('location')
 
         # Get coordinates for all locations
-        coordinates = [get_coordinates_aws(loc) for loc in locations if get_coordinates_aws(loc)]
+        coordinates = [coord for coord in get_coordinates_batch(locations) if coord]
 
         if not coordinates:
             logger.warning("No valid coordinates found for any locations")
@@ -311,7 +240,7 @@ def create_aws_location_map(locations):
         logger.error(f"Error creating AWS Location Service map: {str(e)}", exc_info=True)
         return None
 
-def create_map(locations):
+def create_map(locations, coordinates=None):
     if IS_PRODUCTION:
         logger.info(f"Imagewill be embedded")
         #return create_aws_location_map(locations)
@@ -321,12 +250,15 @@ def create_map(locations):
             logger.warning("No locations provided to create_map function")
             return None
         
+        # Coordinates may be passed in aligned with locations when already resolved
+        if coordinates is None:
+            coordinates = get_coordinates_batch(locations)
+
         valid_coordinates = []
-        for location in locations:
-            coordinates = get_coordinates(location)
-            if coordinates:
-                valid_coordinates.append((coordinates, location))
-                print(f"Location: {location}, Coordinates: {coordinates}")
+        for location, location_coordinates in zip(locations, coordinates):
+            if location_coordinates:
+                valid_coordinates.append((location_coordinates, location))
+                print(f"Location: {location}, Coordinates: {location_coordinates}")
         
         if not valid_coordinates:
             logger.warning("No valid coordinates found for any locations")
@@ -360,78 +292,104 @@ def create_map(locations):
         logger.info(f"Created map with {len(valid_coordinates)} markers")
         return m
 
-def extract_place_info_llm(text, api_client):
-    print("extract_place_info_llm", text)
-    prompt = f"""
-    Analyze the following text and extract information about places (locations) mentioned. For each place, determine:
-    1. The name of the place
-    2. Whether the user is currently interested in this place
-    3. Whether the user wants to visit this place in the future
-    4. Whether the user is simply checking details about this place
+travel_info_schema = {
+    "type": "object",
+    "properties": {
+        "locations": {
+            "type": "array",
+            "items": {"type": "string"}
+        },
+        "places": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "place_name": {"type": "string"},
+                    "current_interest": {"type": "boolean"},
+                    "future_visit": {"type": "boolean"},
+                    "checking_details": {"type": "boolean"}
+                },
+                "required": ["place_name", "current_interest", "future_visit", "checking_details"]
+            }
+        }
+    },
+    "required": ["locations", "places"]
+}
 
-    Consider both specific locations (e.g., cities, countries) and general travel intentions. If the user expresses a desire to travel or plan a trip without mentioning a specific place, create an entry for the general travel intention.
+def parse_travel_info(raw_response):
+    """Parse and validate the combined extraction response.
 
-    Return the result as a JSON array of objects, where each object has the following structure:
+    Returns a (locations, place_info) tuple, or ([], []) if the response is
+    not a JSON object matching travel_info_schema.
+    """
+    travel_info_json = raw_response.strip()
+    # Tolerate markdown fences or stray text around the JSON object
+    start = travel_info_json.find('{')
+    end = travel_info_json.rfind('}')
+    if start == -1 or end == -1:
+        logger.error(f"No JSON object found in travel info response: {raw_response}")
+        if "<!DOCTYPE html>" in raw_response:
+            logger.error("Received HTML response instead of JSON. API might be down or returning an error page.")
+        return [], []
+    try:
+        travel_info = json.loads(travel_info_json[start:end + 1])
+        validate(instance=travel_info, schema=travel_info_schema)
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing JSON response: {str(e)}")
+        logger.error(f"Raw response: {raw_response}")
+        return [], []
+    except ValidationError as e:
+        logger.error(f"Travel info response does not match schema: {e.message}")
+        logger.error(f"Raw response: {raw_response}")
+        return [], []
+    return travel_info['locations'], travel_info['places']
+
+def extract_travel_info_llm(text, api_client):
+    """Extract geocodable establishments and place interest flags from text in one call.
+
+    Returns a (locations, place_info) tuple; see parse_travel_info.
+    """
+    prompt = f"""
+    Analyze the following text from a travel assistant conversation and extract two things.
+
+    1. "locations": the locations associated with establishments. Each location should be in a format suitable for
+    geocoding (e.g., "street name, city name, country"). Only extract locations that are specifically associated with establishments
+    such as hotels, monuments, restaurants, attractions, government offices, emergency services, public facilities, etc.
+    Do not extract any locations from past trips. Only consider the locations the user is currently in or planning to visit.
+    Also, do not extract locations that are merely a mention of a country, state, or city without specifying an establishment.
+
+    2. "places": information about places (locations) mentioned. For each place, determine:
+    - The name of the place
+    - Whether the user is currently interested in this place
+    - Whether the user wants to visit this place in the future
+    - Whether the user is simply checking details about this place
+    Consider both specific locations (e.g., cities, countries) and general travel intentions. If the user expresses a desire to travel
+    or plan a trip without mentioning a specific place, create an entry with "place_name" set to "General Travel Plan".
+
+    Return only a JSON object with the following structure and no extra text before or after it:
     {{
-        "place_name": "Name of the place or 'General Travel Plan' if no specific place is mentioned",
-        "current_interest": true/false,
-        "future_visit": true/false,
-        "checking_details": true/false
+        "locations": ["location 1", "location 2"],
+        "places": [
+            {{
+                "place_name": "Name of the place",
+                "current_interest": true/false,
+                "future_visit": true/false,
+                "checking_details": true/false
+            }}
+        ]
     }}
 
-    If no relevant places or travel intentions are found, return an empty array.
+    Use empty arrays when nothing relevant is found.
 
     Text: {text}
-    Response (JSON array of objects):
+
+    Response (JSON object):
     """
 
     try:
-        if API_MODE == 'bedrock':
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 300,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-            response = bedrock_client.invoke_model(
-                body=body,
-                modelId=AWS_CLAUDE_MODEL_ID,
-                accept='application/json',
-                contentType='application/json'
-            )
-            response_body = json.loads(response.get('body').read())
-            place_info_json = response_body['content'][0]['text']
-        elif API_MODE == 'huggingface':
-            response = api_client.chat(prompt)
-            place_info_json = str(response)
-        elif API_MODE == 'native_claude':
-            response = api_client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=300,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
-            place_info_json = response.content[0].text
+        travel_info_json = get_provider(api_client).complete(prompt, LLM_MAX_TOKENS['extraction'])
 
-        place_info_json = place_info_json.strip()
-        print("--place_info_json--", place_info_json)
-        place_info = json.loads(place_info_json)
-        print("--final_place_info--", place_info)
-        return place_info
-    except json.JSONDecodeError as e:
-        logger.error(f"Error parsing JSON response: {str(e)}")
-        logger.error(f"Raw response: {place_info_json}")
-        if "<!DOCTYPE html>" in place_info_json:
-            logger.error("Received HTML response instead of JSON. API might be down or returning an error page.")
-        return []
+        return parse_travel_info(travel_info_json)
     except Exception as e:
-        logger.error(f"Error extracting place information using LLM: {str(e)}")
-        return []
\ No newline at end of file
+        logger.error(f"Error extracting travel information using LLM: {str(e)}")
+        return [], []
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from config import LOCAL_PHOTOS_DIR, PHOTO_CATALOG_CHECK_INTERVAL, PHOTO_TAGS_FILE, PHOTO_GENERIC_WORD_SHARE
+from image_pipeline import variant_for_file
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Words that never name a destination, whatever the catalogue holds
+_STOP_WORDS = frozenset({
+    # Function words
+    'about', 'all', 'and', 'are', 'for', 'from', 'get', 'near', 'new', 'off', 'that', 'the', 'this', 'with',
+    'your',
+    # Listing and web-page words
+    'amp', 'blog', 'booking', 'copy', 'deal', 'deals', 'expedia', 'guide', 'guides', 'image', 'images', 'latest',
+    'list', 'photo', 'photos', 'picture', 'pictures', 'price', 'prices', 'review', 'reviews', 'top', 'tripadvisor',
+    'updated',
+    # Accommodation and marketing words
+    'affordable', 'beautiful', 'best', 'cheap', 'comfortable', 'enjoy', 'hotel', 'inclusive', 'inn', 'luxurious',
+    'luxury', 'most', 'perfect', 'premium', 'resort', 'room', 'rooms', 'stay', 'stunning', 'travel', 'trip',
+    'visit', 'weekend',
+})
+_MIN_WORD_LENGTH = 3
+# A file-name word also counts as generic if it appears in more than PHOTO_GENERIC_WORD_SHARE
+# of the names, and in at least this many of them
+_GENERIC_MIN_NAMES = 3
+
+PhotoEntry = namedtuple('PhotoEntry', ['path', 'name', 'tags'])
+
+def _singular(word):
+    return word[:-1] if word.endswith('s') and len(word) > _MIN_WORD_LENGTH else word
+
+def tokenize(text):
+    """Return the words of text that could name a destination: long enough and not stop words (plurals included)."""
+    return [word for word in re.findall(r'[a-z]+', text.lower())
+            if len(word) >= _MIN_WORD_LENGTH and word not in _STOP_WORDS and _singular(word) not in _STOP_WORDS]
+
+def generic_words(names, max_share=PHOTO_GENERIC_WORD_SHARE):
+    """Return the words that appear in too many of names to tell the photos apart."""
+    counts = Counter(word for name in names for word in set(tokenize(name)))
+    limit = max(_GENERIC_MIN_NAMES - 1, max_share * len(names))
+    generic = {word for word, count in counts.items() if count > limit}
+    # "resort" is as generic as "resorts"
+    return generic | {word for word in counts if _singular(word) in generic or word + 's' in generic}
+
+class PhotoCatalog:
+    """In-memory index of the local photos directory.
+
+    The directory is scanned once and rescanned only when its mtime changes
+    (checked at most every check_interval seconds). Each photo is tagged with
+    the words in its file name that are not stop words or common to many
+    other names, plus any tags listed for it in the optional tags file, and
+    its thumbnail and carousel variants are generated in the background
+    after each scan.
+    """
+
+    def __init__(self, directory, check_interval=PHOTO_CATALOG_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = []
+        self._by_tag = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="photo-catalog")
+
+    def _directory_mtime(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_tags(self):
+        path = os.path.join(self.directory, PHOTO_TAGS_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return {name: [tag.lower() for tag in tags] for name, tags in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"Error reading photo tags file: {str(e)}")
+            return {}
+
+    def _scan(self):
+        extra_tags = self._load_tags()
+        entries = []
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.lower().endswith(PHOTO_EXTENSIONS))
+        except OSError as e:
+            logger.error(f"Error listing local photos: {str(e)}")
+            names = []
+        stems = [os.path.splitext(name)[0] for name in names]
+        generic = generic_words(stems)
+        for name, stem in zip(names, stems):
+            tags = frozenset([word for word in tokenize(stem) if word not in generic] + extra_tags.get(name, []))
+            entries.append(PhotoEntry(os.path.join(self.directory, name), name, tags))
+
+        by_tag = {}
+        for entry in entries:
+            for tag in entry.tags:
+                by_tag.setdefault(tag, []).append(entry)
+        return entries, by_tag
+
+    def _warm(self, entries):
+        for entry in entries:
+            variant_for_file(entry.path, 'thumbnail')
+            variant_for_file(entry.path, 'carousel')
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._mtime is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            mtime = self._directory_mtime()
+            if mtime == self._mtime and self._mtime is not None:
+                return
+            entries, by_tag = self._scan()
+            self._entries, self._by_tag, self._mtime = entries, by_tag, mtime
+            logger.info(f"Photo catalogue loaded {len(entries)} photos from {self.directory}")
+        self._warmer.submit(self._warm, entries)
+
+    def entries(self):
+        self._refresh()
+        return self._entries
+
+    def matching(self, destination=None):
+        """Return the photos tagged with any word of destination, best match first, or all photos if none match."""
+        self._refresh()
+        entries, by_tag = self._entries, self._by_tag
+        if destination:
+            # Photos matching more words of the destination come first
+            scores = {}
+            for word in set(tokenize(destination)):
+                for entry in by_tag.get(word, ()):
+                    scores[entry] = scores.get(entry, 0) + 1
+            if scores:
+                return sorted(scores, key=lambda entry: (-scores[entry], entry.name))
+        return entries
+
+    def pick(self, destination=None, index=0, seed=''):
+        """Return a stable photo for (destination, seed, index), or None if there are no photos."""
+        candidates = self.matching(destination)
+        if not candidates:
+            return None
+        offset = zlib.crc32(seed.encode('utf-8'))
+        return candidates[(offset + index) % len(candidates)]
+
+photo_catalog = PhotoCatalog(LOCAL_PHOTOS_DIR)
+
+def get_local_photo(destination=None, index=0, seed='', variant='carousel'):
+    entry = photo_catalog.pick(destination, index, seed)
+    if entry is None:
+        logger.warning("No local photos found in the photos directory.")
+        return None
+    return variant_for_file(entry.path, variant)
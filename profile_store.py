@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class ProfileStore:
+    """SQLite store of user profiles, one JSON document per username.
+
+    The database runs in WAL mode so readers in other sessions or processes
+    are not blocked by a writer, and every operation touches a single row
+    instead of the whole user base.
+
+    Writes are group-committed: each writer queues its change and a single
+    writer thread applies everything queued within batch_window seconds in
+    one BEGIN IMMEDIATE transaction, so read-modify-write updates from concurrent
+    sessions or processes are serialised and a burst of writes costs one
+    commit. Each change runs in its own savepoint, so a failing change does
+    not take the rest of the batch down with it. Callers return only after
+    their change is committed.
+    """
+
+    def __init__(self, path, busy_timeout=10.0, batch_window=0.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_window = batch_window
+        self.commits = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+        # isolation_level=None leaves transaction control to the explicit BEGIN statements below
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout, isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        def create_tables():
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    username TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+        with self._lock:
+            self._transaction(create_tables)
+
+    def _transaction(self, body):
+        # BEGIN IMMEDIATE takes the write lock up front, so no other process can change a row between our read and write
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = body()
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    def _get(self, username):
+        row = self._conn.execute("SELECT data FROM profiles WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, username, profile):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (username, data, updated_at) VALUES (?, ?, ?)",
+            (username, json.dumps(profile), time.time())
+        )
+
+    def _write(self, change):
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((change, future))
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                self._writer.submit(self._flush)
+        return future.result()
+
+    def _flush(self):
+        if self.batch_window:
+            # Let writers arriving in the next few milliseconds join this commit
+            time.sleep(self.batch_window)
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+            self._flush_scheduled = False
+        results = []
+
+        def apply_batch():
+            for change, future in batch:
+                self._conn.execute("SAVEPOINT change")
+                try:
+                    results.append((future, change(), None))
+                    self._conn.execute("RELEASE change")
+                except Exception as e:
+                    self._conn.execute("ROLLBACK TO change")
+                    self._conn.execute("RELEASE change")
+                    results.append((future, None, e))
+
+        try:
+            with self._lock:
+                self._transaction(apply_batch)
+                self.commits += 1
+                self.writes += len(batch)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def get(self, username):
+        with self._lock:
+            return self._get(username)
+
+    def put(self, username, profile):
+        self._write(lambda: self._put(username, profile))
+
+    def append_trip(self, username, trip_type, trip, default_profile):
+        """Append trip to the user's trip_type list in one transaction, creating the profile from default_profile if needed."""
+        def change():
+            profile = self._get(username) or default_profile
+            profile.setdefault(trip_type, []).append(trip)
+            self._put(username, profile)
+            return profile
+        return self._write(change)
+
+    def data_version(self):
+        """Counter that changes whenever another connection (e.g. another process) commits to the database."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def usernames(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT username FROM profiles ORDER BY username")]
+
+    def migrate_from_json(self, json_path):
+        """Import the legacy JSON profiles file once; later runs are no-ops.
+
+        The check and the import share one write transaction, so processes
+        starting at the same time cannot both import.
+        """
+        def migrate():
+            if self._conn.execute("SELECT 1 FROM store_meta WHERE key = 'json_migrated'").fetchone():
+                return 0
+            try:
+                with open(json_path, 'r') as f:
+                    profiles = json.load(f)
+            except FileNotFoundError:
+                profiles = {}
+            except json.JSONDecodeError:
+                logger.error("Error decoding user profiles file. Skipping migration.")
+                return 0
+            for username, profile in profiles.items():
+                # Keep profiles that were already written to the store
+                if self._get(username) is None:
+                    self._put(username, profile)
+            self._conn.execute("INSERT INTO store_meta (key, value) VALUES ('json_migrated', ?)", (json_path,))
+            logger.info(f"Migrated {len(profiles)} user profiles from {json_path}")
+            return len(profiles)
+
+        with self._lock:
+            return self._transaction(migrate)
+
+    def stats(self):
+        with self._lock:
+            return {"writes": self.writes, "commits": self.commits}
@@ -0,0 +1,179 @@
+import logging
+import random
+import threading
+import time
+import anthropic
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
+from config import (LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_MAX_CONCURRENCY,
+                    LLM_QUEUE_TIMEOUT, LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+# Bedrock reports throttling with different codes (and casing inside event streams)
+THROTTLING_ERROR_CODES = {
+    'throttlingexception',
+    'toomanyrequestsexception',
+    'serviceunavailableexception',
+    'modelnotreadyexception',
+    'modeltimeoutexception',
+}
+
+class CircuitOpenError(Exception):
+    """Raised when a backend's circuit breaker is open and calls are rejected."""
+
+class ConcurrencyLimitError(Exception):
+    """Raised when no concurrency slot frees up within LLM_QUEUE_TIMEOUT."""
+
+def is_retryable(error):
+    # botocore's own retries are off for Bedrock, so failures to connect are retried here too. Read
+    # timeouts and dropped connections are not: each attempt can take AWS_READ_TIMEOUT, and they are not throttling.
+    if isinstance(error, BotoConnectionError):
+        return True
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code', '').lower() in THROTTLING_ERROR_CODES
+    if isinstance(error, (anthropic.RateLimitError, anthropic.InternalServerError, anthropic.APIConnectionError)):
+        return True
+    # hugchat has no common base class for overload errors
+    return type(error).__name__ == 'ModelOverloadedException'
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive throttling failures.
+
+    While open, calls are rejected for reset_timeout seconds; after that a
+    single trial call is let through (half-open) and closes the circuit again
+    if it succeeds.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} throttling failures")
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        # The trial call failed for a reason unrelated to throttling
+        with self._lock:
+            self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+class _BackendGuard:
+    def __init__(self, name):
+        self.breaker = CircuitBreaker(name, LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_TIMEOUT)
+        self.slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+def _guard(backend):
+    with _guards_lock:
+        if backend not in _guards:
+            _guards[backend] = _BackendGuard(backend)
+        return _guards[backend]
+
+def backoff_delay(attempt):
+    # Full jitter: spreads retries from concurrent sessions instead of syncing them
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+def _call_holding_slot(backend, fn, *args, **kwargs):
+    # call_llm's retry loop; on success the concurrency slot is still held and the caller must release it
+    guard = _guard(backend)
+    attempt = 0
+    while True:
+        if not guard.breaker.allow():
+            raise CircuitOpenError(f"{backend} is temporarily unavailable after repeated throttling")
+        if not guard.slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            # allow() may have handed us the half-open trial; give it back or the circuit never closes
+            guard.breaker.release_trial()
+            raise ConcurrencyLimitError(f"Timed out waiting for a free {backend} slot")
+        succeeded = False
+        try:
+            result = fn(*args, **kwargs)
+            succeeded = True
+        except Exception as e:
+            if not is_retryable(e):
+                guard.breaker.release_trial()
+                raise
+            guard.breaker.record_failure()
+            if attempt >= LLM_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{backend} throttled ({type(e).__name__}), retrying in {delay:.2f}s (attempt {attempt + 1}/{LLM_MAX_RETRIES})")
+        else:
+            guard.breaker.record_success()
+            return guard, result
+        finally:
+            if not succeeded:
+                guard.slots.release()
+        attempt += 1
+        time.sleep(delay)
+
+def call_llm(backend, fn, *args, **kwargs):
+    """Call an LLM client function with retries, a circuit breaker and a concurrency limit.
+
+    Throttling errors are retried with jittered exponential backoff, up to
+    LLM_MAX_RETRIES times. Other errors propagate unchanged so the existing
+    error handling at each call site still applies.
+    """
+    guard, result = _call_holding_slot(backend, fn, *args, **kwargs)
+    guard.slots.release()
+    return result
+
+def stream_llm(backend, open_stream):
+    """Resilient wrapper for streaming calls.
+
+    open_stream returns an iterator of chunks. The stream is opened and its
+    first chunk read with call_llm's retries, so throttling is retried up to
+    that point; once output has started it is passed through as is. The
+    concurrency slot is held until the stream is exhausted or closed.
+    """
+    def open_with_first_chunk():
+        iterator = iter(open_stream())
+        for chunk in iterator:
+            return iterator, [chunk]
+        return iterator, []
+
+    guard, (iterator, head) = _call_holding_slot(backend, open_with_first_chunk)
+    try:
+        yield from head
+        yield from iterator
+    finally:
+        guard.slots.release()
+
+def breaker_states():
+    with _guards_lock:
+        return {backend: guard.breaker.state for backend, guard in _guards.items()}
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import queue
+import threading
+from collections import namedtuple
+import numpy as np
+from config import AWS_REGION, STT_ENGINE, STT_LANGUAGE_CODE, STT_SAMPLE_RATE, STT_CHUNK_MS, STT_LOCAL_TRANSCRIPT
+
+logger = logging.getLogger(__name__)
+
+# text is the transcript of the current segment; once is_final is set the segment will not change again
+TranscriptEvent = namedtuple('TranscriptEvent', ['text', 'is_final'])
+
+def pcm_chunks(audio_data, samplerate=STT_SAMPLE_RATE, chunk_ms=STT_CHUNK_MS):
+    """Split float32 samples in [-1, 1] into 16-bit little-endian PCM chunks of chunk_ms each."""
+    samples = np.clip(np.asarray(audio_data, dtype=np.float32).reshape(-1), -1.0, 1.0)
+    pcm = (samples * 32767).astype('<i2').tobytes()
+    chunk_bytes = max(2, int(samplerate * chunk_ms / 1000) * 2)
+    for start in range(0, len(pcm), chunk_bytes):
+        yield pcm[start:start + chunk_bytes]
+
+class TranscriptionEngine:
+    """Streams PCM audio chunks to a speech-to-text backend and yields TranscriptEvents as they arrive."""
+
+    def stream(self, chunks, samplerate=STT_SAMPLE_RATE):
+        raise NotImplementedError
+
+    def transcribe_stream(self, audio_data, samplerate=STT_SAMPLE_RATE):
+        return self.stream(pcm_chunks(audio_data, samplerate), samplerate)
+
+    def transcribe(self, audio_data, samplerate=STT_SAMPLE_RATE):
+        return join_final(self.transcribe_stream(audio_data, samplerate))
+
+def join_final(events):
+    return " ".join(event.text.strip() for event in events if event.is_final and event.text.strip())
+
+class AWSStreamingEngine(TranscriptionEngine):
+    """Amazon Transcribe streaming over HTTP/2; no S3 upload or job polling.
+
+    The amazon-transcribe SDK is asyncio based, so the session runs on its own
+    event loop in a worker thread and hands events back through a queue.
+    """
+
+    def __init__(self, region=AWS_REGION, language_code=STT_LANGUAGE_CODE):
+        self.region = region
+        self.language_code = language_code
+
+    def stream(self, chunks, samplerate=STT_SAMPLE_RATE):
+        # Imported here so the rest of the app runs without the optional SDK
+        from amazon_transcribe.client import TranscribeStreamingClient
+        from amazon_transcribe.handlers import TranscriptResultStreamHandler
+
+        events = queue.Queue()
+        done = object()
+
+        class Handler(TranscriptResultStreamHandler):
+            async def handle_transcript_event(self, transcript_event):
+                for result in transcript_event.transcript.results:
+                    if result.alternatives:
+                        events.put(TranscriptEvent(result.alternatives[0].transcript, not result.is_partial))
+
+        async def session():
+            client = TranscribeStreamingClient(region=self.region)
+            transcription = await client.start_stream_transcription(
+                language_code=self.language_code,
+                media_sample_rate_hz=samplerate,
+                media_encoding='pcm'
+            )
+
+            async def send_audio():
+                for chunk in chunks:
+                    await transcription.input_stream.send_audio_event(audio_chunk=chunk)
+                await transcription.input_stream.end_stream()
+
+            await asyncio.gather(send_audio(), Handler(transcription.output_stream).handle_events())
+
+        def run():
+            try:
+                asyncio.run(session())
+            except Exception as e:
+                events.put(e)
+            finally:
+                events.put(done)
+
+        threading.Thread(target=run, name="transcribe-stream", daemon=True).start()
+        while True:
+            event = events.get()
+            if event is done:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+class LocalTranscriptionEngine(TranscriptionEngine):
+    """Offline stand-in that reveals a fixed transcript word by word as audio is consumed.
+
+    Used for development and tests without AWS credentials; the transcript
+    ignores the audio content.
+    """
+
+    def __init__(self, transcript=STT_LOCAL_TRANSCRIPT):
+        self.transcript = transcript
+
+    def stream(self, chunks, samplerate=STT_SAMPLE_RATE):
+        words = self.transcript.split()
+        received = 0
+        for _ in chunks:
+            received += 1
+            # One more word of partial transcript per chunk of audio, like a live recogniser catching up
+            if received <= len(words):
+                yield TranscriptEvent(" ".join(words[:received]), False)
+        if received and words:
+            yield TranscriptEvent(self.transcript, True)
+
+ENGINES = {
+    'aws': AWSStreamingEngine,
+    'local': LocalTranscriptionEngine,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_transcription_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            if STT_ENGINE not in ENGINES:
+                raise ValueError(f"Unknown STT_ENGINE '{STT_ENGINE}'. Expected one of: {', '.join(ENGINES)}")
+            _engine = ENGINES[STT_ENGINE]()
+        return _engine
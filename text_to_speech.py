@@ -0,0 +1,142 @@
+import base64
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from config import TTS_VOICE_ID, TTS_OUTPUT_FORMAT, TTS_MAX_WORKERS, TTS_MIN_CHUNK_CHARS, TTS_MAX_CHUNK_CHARS
+from api_client import synthesize_speech
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+_MARKDOWN = re.compile(r'[*_#`>|]+')
+_BULLET = re.compile(r'^\s*[-+•]\s+')
+
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS, thread_name_prefix="tts")
+
+def clean_for_speech(text):
+    """Drop markdown markup so it is not read out, and collapse whitespace."""
+    return re.sub(r'\s+', ' ', _MARKDOWN.sub(' ', _BULLET.sub('', text))).strip()
+
+def split_long(text, max_chars=TTS_MAX_CHUNK_CHARS):
+    # Break at the last comma or space that keeps each part under max_chars
+    while len(text) > max_chars:
+        cut = max(text.rfind(', ', 0, max_chars), text.rfind(' ', 0, max_chars))
+        if cut <= 0:
+            # No separator to break at: hard cut so the part is exactly max_chars long
+            cut = max_chars - 1
+        yield text[:cut + 1].strip()
+        text = text[cut + 1:]
+    if text.strip():
+        yield text.strip()
+
+class SentenceBuffer:
+    """Accumulates streamed text and hands out speakable chunks at sentence boundaries.
+
+    Sentences shorter than min_chars are merged with the following one so
+    Polly is not called for every "Sure!" on its own.
+    """
+
+    def __init__(self, min_chars=TTS_MIN_CHUNK_CHARS):
+        self.min_chars = min_chars
+        self._text = ""
+        self._pending = ""
+
+    def _emit(self, sentence, force=False):
+        self._pending = f"{self._pending} {sentence}".strip() if self._pending else sentence
+        if force or len(self._pending) >= self.min_chars:
+            chunk, self._pending = clean_for_speech(self._pending), ""
+            if chunk:
+                yield from split_long(chunk)
+
+    def feed(self, text):
+        self._text += text
+        parts = _SENTENCE_END.split(self._text)
+        # The last part may be an unfinished sentence; keep it for the next feed
+        self._text = parts.pop()
+        for sentence in parts:
+            sentence = _BULLET.sub('', sentence).strip()
+            if sentence:
+                yield from self._emit(sentence)
+
+    def flush(self):
+        sentence, self._text = self._text.strip(), ""
+        if sentence or self._pending:
+            yield from self._emit(sentence, force=True)
+
+class SpeechPipeline:
+    """Synthesises chunks concurrently as they are fed and returns the audio in speaking order."""
+
+    def __init__(self, voice_id=TTS_VOICE_ID, output_format=TTS_OUTPUT_FORMAT):
+        self.voice_id = voice_id
+        self.output_format = output_format
+        self._buffer = SentenceBuffer()
+        self._futures = []
+
+    def _submit(self, chunks):
+        for chunk in chunks:
+            self._futures.append(_tts_executor.submit(synthesize_speech, chunk, self.voice_id, self.output_format))
+
+    def feed(self, text):
+        self._submit(self._buffer.feed(text))
+
+    def close(self):
+        self._submit(self._buffer.flush())
+
+    def _pop(self):
+        future = self._futures.pop(0)
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Speech synthesis failed: {str(e)}")
+            return None
+
+    def ready(self):
+        """Yield audio for the leading chunks that have finished, without waiting."""
+        while self._futures and self._futures[0].done():
+            audio = self._pop()
+            if audio:
+                yield audio
+
+    def remaining(self):
+        """Yield audio for all outstanding chunks in order, waiting for each."""
+        while self._futures:
+            audio = self._pop()
+            if audio:
+                yield audio
+
+# Plays queued clips one after another from the parent page, so clips rendered in
+# separate component iframes neither overlap nor stop when their iframe is replaced
+_PLAYER_SCRIPT = """
+<script>
+(function () {
+  const host = window.parent;
+  let tts = host.__travelEaseTts;
+  if (!tts) {
+    tts = host.__travelEaseTts = {queue: [], playing: false, audio: new host.Audio()};
+    tts.next = function () {
+      const src = tts.queue.shift();
+      if (!src) { tts.playing = false; return; }
+      tts.playing = true;
+      tts.audio.src = src;
+      tts.audio.play().catch(function () { tts.next(); });
+    };
+    tts.audio.addEventListener('ended', function () { tts.next(); });
+  }
+  if (%(reset)s) {
+    tts.queue.length = 0;
+    tts.audio.pause();
+    tts.playing = false;
+  }
+  tts.queue.push("data:%(mime)s;base64,%(audio)s");
+  if (!tts.playing) { tts.next(); }
+})();
+</script>
+"""
+
+def audio_player_html(audio_bytes, output_format=TTS_OUTPUT_FORMAT, reset=False):
+    """HTML for a zero-height component that queues audio_bytes for playback; reset stops whatever is playing first."""
+    return _PLAYER_SCRIPT % {
+        "reset": "true" if reset else "false",
+        "mime": "audio/mpeg" if output_format == 'mp3' else f"audio/{output_format}",
+        "audio": base64.b64encode(audio_bytes).decode(),
+    }
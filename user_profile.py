@@ -1,98 +1,135 @@
-import json
+import copy
 import logging
-from config import USER_PROFILES_FILE
+import sqlite3
+import threading
+from config import USER_PROFILES_FILE, USER_PROFILES_DB, PROFILE_DB_BUSY_TIMEOUT, PROFILE_WRITE_BATCH_WINDOW
+from profile_store import ProfileStore
 
 logger = logging.getLogger(__name__)
 
-def load_user_profile(username):
-    try:
-        with open(USER_PROFILES_FILE, 'r') as f:
-            profiles = json.load(f)
-        
-        default_profile = {
-            "past_trips": [],
-            "upcoming_trips": [],
-            "credit_cards": [],
-            "preferences": {
-                "dining": {
-                    "favorite_cuisines": [],
-                    "frequently_visited_restaurants": [],
-                    "dietary_restrictions": []
-                },
-                "shopping": {
-                    "preferred_stores": [],
-                    "online_retailers": []
-                },
-                "entertainment": {
-                    "streaming_services": [],
-                    "hobbies": []
-                },
-                "travel": {
-                    "preferred_airlines": [],
-                    "hotel_chains": [],
-                    "travel_style": []
-                }
+def default_profile():
+    return {
+        "past_trips": [],
+        "upcoming_trips": [],
+        "credit_cards": [],
+        "preferences": {
+            "dining": {
+                "favorite_cuisines": [],
+                "frequently_visited_restaurants": [],
+                "dietary_restrictions": []
+            },
+            "shopping": {
+                "preferred_stores": [],
+                "online_retailers": []
+            },
+            "entertainment": {
+                "streaming_services": [],
+                "hobbies": []
+            },
+            "travel": {
+                "preferred_airlines": [],
+                "hotel_chains": [],
+                "travel_style": []
             }
         }
-        
-        user_profile = profiles.get(username, default_profile)
-        
-        # Ensure all keys are present in the user profile
-        for key, value in default_profile.items():
-            if key not in user_profile:
-                user_profile[key] = value
-        
+    }
+
+profile_store = ProfileStore(USER_PROFILES_DB, busy_timeout=PROFILE_DB_BUSY_TIMEOUT, batch_window=PROFILE_WRITE_BATCH_WINDOW)
+try:
+    profile_store.migrate_from_json(USER_PROFILES_FILE)
+except sqlite3.Error as e:
+    logger.error(f"Error migrating user profiles: {str(e)}")
+
+# Process-wide profile cache. Every write bumps the user's version so sessions holding a copy can tell it is stale.
+_cache_lock = threading.Lock()
+_profile_cache = {}
+_profile_versions = {}
+# Bumped when another process commits, which invalidates every user's version at once
+_external_generation = 0
+_seen_data_version = None
+
+def _with_defaults(user_profile):
+    # Ensure all keys are present in the user profile
+    for key, value in default_profile().items():
+        if key not in user_profile:
+            user_profile[key] = value
+    return user_profile
+
+def _check_external_writes():
+    # Another process committed to the store: drop everything cached and bump every version
+    global _seen_data_version, _external_generation
+    try:
+        data_version = profile_store.data_version()
+    except sqlite3.Error as e:
+        logger.error(f"Error checking user profile store: {str(e)}")
+        return
+    with _cache_lock:
+        if data_version != _seen_data_version:
+            if _seen_data_version is not None:
+                _profile_cache.clear()
+                _external_generation += 1
+            _seen_data_version = data_version
+
+def _current_version(username):
+    # Caller holds _cache_lock; both counters only grow, so their sum does too
+    return _external_generation + _profile_versions.get(username, 0)
+
+def _update_cache(username, user_profile):
+    with _cache_lock:
+        _profile_cache[username] = user_profile
+        _profile_versions[username] = _profile_versions.get(username, 0) + 1
+
+def _cached_profile(username):
+    """Return the shared cached profile for username. Callers must not mutate it."""
+    _check_external_writes()
+    with _cache_lock:
+        user_profile = _profile_cache.get(username)
+        version = _current_version(username)
+    if user_profile is not None:
         return user_profile
-    
-    except FileNotFoundError:
-        logger.warning("User profiles file not found. Creating new file.")
-        with open(USER_PROFILES_FILE, 'w') as f:
-            json.dump({}, f)
-        return default_profile
-    
-    except json.JSONDecodeError:
-        logger.error("Error decoding user profiles file.")
-        return default_profile
+
+    try:
+        user_profile = profile_store.get(username)
+    except sqlite3.Error as e:
+        logger.error(f"Error reading user profile: {str(e)}")
+        return default_profile()
+    user_profile = _with_defaults(user_profile) if user_profile is not None else default_profile()
+
+    with _cache_lock:
+        # Skip caching if a write landed while we were reading
+        if _current_version(username) == version:
+            _profile_cache[username] = user_profile
+    return user_profile
+
+def profile_version(username):
+    """Cheap check for whether a copy of username's profile is stale; increases on every write, including other processes'."""
+    _check_external_writes()
+    with _cache_lock:
+        return _current_version(username)
+
+def load_user_profile(username):
+    # Callers keep and may modify the result, so hand out a copy of the cached profile
+    return copy.deepcopy(_cached_profile(username))
 
 def load_user_profile_old(username):
     try:
-        with open(USER_PROFILES_FILE, 'r') as f:
-            profiles = json.load(f)
-        return profiles.get(username, {"past_trips": [], "upcoming_trips": []})
-    except FileNotFoundError:
-        logger.warning("User profiles file not found. Creating new file.")
-        with open(USER_PROFILES_FILE, 'w') as f:
-            json.dump({}, f)
-        return {"past_trips": [], "upcoming_trips": []}
-    except json.JSONDecodeError:
-        logger.error("Error decoding user profiles file.")
-        return {"past_trips": [], "upcoming_trips": []}
+        user_profile = profile_store.get(username)
+    except sqlite3.Error as e:
+        logger.error(f"Error reading user profile: {str(e)}")
+        user_profile = None
+    return user_profile or {"past_trips": [], "upcoming_trips": []}
 
 def save_user_profile(username, profile):
-    try:
-        with open(USER_PROFILES_FILE, 'r') as f:
-            profiles = json.load(f)
-    except FileNotFoundError:
-        profiles = {}
-    except json.JSONDecodeError:
-        logger.error("Error decoding user profiles file. Overwriting with new data.")
-        profiles = {}
-    
-    profiles[username] = profile
-    
-    with open(USER_PROFILES_FILE, 'w') as f:
-        json.dump(profiles, f, indent=2)
+    profile_store.put(username, profile)
+    _update_cache(username, _with_defaults(copy.deepcopy(profile)))
 
 def add_trip(trip_type, username, trip_data):
-    user_profile = load_user_profile(username)
-    user_profile[trip_type].append(trip_data)
-    save_user_profile(username, user_profile)
+    user_profile = profile_store.append_trip(username, trip_type, trip_data, default_profile())
+    _update_cache(username, _with_defaults(user_profile))
 
 def get_trips(username, trip_type):
-    user_profile = load_user_profile(username)
-    return user_profile.get(trip_type, [])
+    return copy.deepcopy(_cached_profile(username).get(trip_type, []))
 
 def get_user_country(username):
-    user_profile = load_user_profile(username)
     # Assuming the user's country is stored in the profile
-    return user_profile.get('country', 'Unknown')
+    return _cached_profile(username).get('country', 'Unknown')
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+_COST_PATTERN = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+def hash_cost(password_hash):
+    match = _COST_PATTERN.match(password_hash)
+    return int(match.group(1)) if match else None
+
+class UserIndex:
+    """Password hashes from the users file, indexed by username.
+
+    The file is parsed once and reloaded only when its mtime or size changes,
+    checked at most every check_interval seconds. Hashes whose bcrypt cost
+    differs from rounds are replaced after a successful login, and the file
+    is rewritten atomically (temp file, fsync, rename).
+    """
+
+    def __init__(self, path, rounds, check_interval=2.0):
+        self.path = path
+        self.rounds = rounds
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self._dummy_hash = None
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._signature is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            with open(self.path, 'r') as f:
+                users = json.load(f)["users"]
+            self._hashes = {user["username"]: user["password"] for user in users}
+            self._signature = signature
+            logger.info(f"Loaded {len(self._hashes)} users from {self.path}")
+
+    def _placeholder_hash(self):
+        # Checked for unknown usernames so a miss costs the same as a wrong password
+        if self._dummy_hash is None:
+            self._dummy_hash = bcrypt.hashpw(os.urandom(16).hex().encode('utf-8'), bcrypt.gensalt(self.rounds))
+        return self._dummy_hash
+
+    def verify(self, username, password):
+        """Check password with a single bcrypt.checkpw, upgrading the stored hash if its cost is out of date."""
+        self._refresh()
+        with self._lock:
+            stored = self._hashes.get(username)
+        if stored is None:
+            bcrypt.checkpw(password.encode('utf-8'), self._placeholder_hash())
+            return False
+        if not bcrypt.checkpw(password.encode('utf-8'), stored.encode('utf-8')):
+            return False
+        if hash_cost(stored) != self.rounds:
+            try:
+                self._rehash(username, stored, password)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Error upgrading password hash for {username}: {str(e)}")
+        return True
+
+    def _rehash(self, username, old_hash, password):
+        new_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8')
+        with self._lock:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for user in data["users"]:
+                # Leave the entry alone if the password changed while we were hashing
+                if user["username"] == username and user["password"] == old_hash:
+                    user["password"] = new_hash
+                    break
+            else:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self._hashes = {user["username"]: user["password"] for user in data["users"]}
+            self._signature = self._file_signature()
+        logger.info(f"Upgraded password hash for {username} to cost {self.rounds}")